@@ -0,0 +1,88 @@
+import os
+import shutil
+import atexit
+import subprocess
+import threading
+import ffmpeg
+import json_store
+
+# Shared on-disk cache for ffprobe results and ffmpeg capabilities
+CACHE_DIR = json_store.CACHE_DIR
+CACHE_PATH = os.path.join(CACHE_DIR, "ffmpeg_cache.json")
+MAX_ENTRIES = 5000  # Per section; oldest entries are dropped first
+
+_lock = threading.Lock()
+_cache = None
+_dirty = False  # put() only changes memory; flush() writes once, at the latest when the process exits
+
+def _load():
+    global _cache
+    if _cache is None:
+        _cache = json_store.read(CACHE_PATH)
+    return _cache
+
+def flush():
+    """Merge our entries with whatever other processes wrote since we loaded, then replace the file atomically."""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        json_store.merge(CACHE_PATH, _cache, MAX_ENTRIES)
+        _dirty = False
+
+atexit.register(flush)
+
+def file_key(path):
+    """Identify a file by absolute path, size and modification time."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+def ffmpeg_key(binary="ffmpeg"):
+    """Identify the ffmpeg build by its resolved binary, without spawning it."""
+    path = shutil.which(binary)
+    if not path:
+        return None
+    return file_key(os.path.realpath(path))
+
+def get(section, key):
+    with _lock:
+        return _load().get(section, {}).get(key)
+
+def put(section, key, value):
+    global _dirty
+    with _lock:
+        entries = _load().setdefault(section, {})
+        entries.pop(key, None)
+        entries[key] = value
+        _dirty = True
+
+def probe(path):
+    """ffmpeg.probe, cached by path+size+mtime. Raises ffmpeg.Error like ffmpeg.probe."""
+    key = file_key(path)
+    result = get("probe", key)
+    if result is None:
+        result = ffmpeg.probe(path)
+        put("probe", key, result)
+    return result
+
+def encoders():
+    """Names of the encoders the installed ffmpeg provides, cached per ffmpeg binary."""
+    key = ffmpeg_key()
+    names = get("encoders", key) if key else None
+    if names is None:
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        names = []
+        listing = False
+        for line in result.stdout.splitlines():
+            if line.strip().startswith("------"):
+                listing = True
+            elif listing and len(line.split()) > 1:
+                names.append(line.split()[1])
+        if key and names:
+            put("encoders", key, names)
+    return names
@@ -0,0 +1,146 @@
+import asyncio
+import collections
+import subprocess
+import time
+
+STDERR_LINES = 200  # Only the tail of stderr is kept for error messages
+STALL_SECONDS = 120  # Kill ffmpeg when progress stops advancing for this long
+
+# One parsed `-progress` block. Times are in seconds; missing values are None.
+ProgressEvent = collections.namedtuple(
+    "ProgressEvent", "out_time frame fps speed bitrate total_size done"
+)
+# returncode is None when ffmpeg was killed for stalling or by the caller
+FFmpegResult = collections.namedtuple("FFmpegResult", "returncode stderr stalled aborted last")
+
+def _number(value, suffix=""):
+    if value is None:
+        return None
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None  # "N/A" before the first frame
+
+def parse_block(fields):
+    """Turn the key=value pairs of one -progress block into a ProgressEvent."""
+    # out_time_ms is really microseconds in ffmpeg; prefer the explicit out_time_us
+    micros = _number(fields.get("out_time_us", fields.get("out_time_ms")))
+    frame = _number(fields.get("frame"))
+    total_size = _number(fields.get("total_size"))
+    return ProgressEvent(
+        out_time=micros / 1_000_000 if micros is not None and micros >= 0 else None,
+        frame=int(frame) if frame is not None else None,
+        fps=_number(fields.get("fps")),
+        speed=_number(fields.get("speed"), "x"),
+        bitrate=_number(fields.get("bitrate"), "kbits/s"),
+        total_size=int(total_size) if total_size is not None else None,
+        done=fields.get("progress") == "end",
+    )
+
+def with_progress(cmd):
+    """Insert the -progress options right after the ffmpeg binary."""
+    return [cmd[0], "-progress", "pipe:1", "-nostats"] + list(cmd[1:])
+
+async def run_ffmpeg_async(cmd, on_progress=None, stall_seconds=STALL_SECONDS, log=None, stderr_lines=STDERR_LINES):
+    """
+    Run ffmpeg, parse its -progress blocks from stdout and keep a bounded stderr tail.
+
+    on_progress(event) is called for each block; returning False aborts the encode.
+    ffmpeg is killed if out_time and total_size both stop advancing for stall_seconds.
+    Cancelling the task kills ffmpeg too.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *with_progress(cmd),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    tail = collections.deque(maxlen=stderr_lines)
+    state = {"last": None, "advanced": time.monotonic(), "mark": None, "stalled": False, "aborted": False}
+
+    def kill():
+        if process.returncode is None:
+            process.kill()
+
+    async def read_progress():
+        fields = {}
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            key, _, value = line.decode("utf-8", "replace").strip().partition("=")
+            fields[key] = value
+            if key != "progress":
+                continue
+            event = parse_block(fields)
+            fields = {}
+            state["last"] = event
+            mark = (event.out_time, event.total_size)
+            if mark != state["mark"]:
+                state["mark"] = mark
+                state["advanced"] = time.monotonic()
+            if on_progress and on_progress(event) is False:
+                state["aborted"] = True
+                kill()
+
+    async def read_stderr():
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                break
+            text = line.decode("utf-8", "replace")
+            tail.append(text)
+            if log:
+                log.write(text)
+
+    async def watchdog():
+        while process.returncode is None:
+            await asyncio.sleep(min(1.0, stall_seconds))
+            if time.monotonic() - state["advanced"] > stall_seconds:
+                state["stalled"] = True
+                tail.append(f"No progress for {stall_seconds}s, killing ffmpeg\n")
+                kill()
+                return
+
+    watcher = asyncio.ensure_future(watchdog())
+    try:
+        await asyncio.gather(read_progress(), read_stderr())
+        await process.wait()
+    except asyncio.CancelledError:
+        kill()
+        await process.wait()
+        raise
+    finally:
+        watcher.cancel()
+
+    killed = state["stalled"] or state["aborted"]
+    return FFmpegResult(
+        returncode=None if killed else process.returncode,
+        stderr="".join(tail),
+        stalled=state["stalled"],
+        aborted=state["aborted"],
+        last=state["last"],
+    )
+
+def run_ffmpeg(cmd, on_progress=None, stall_seconds=STALL_SECONDS, log=None, stderr_lines=STDERR_LINES):
+    """Blocking wrapper around run_ffmpeg_async for callers without an event loop."""
+    return asyncio.run(run_ffmpeg_async(cmd, on_progress, stall_seconds, log, stderr_lines))
+
+def tqdm_progress(progress_bar, duration):
+    """An on_progress consumer that drives a tqdm bar over `duration` seconds."""
+    def update(event):
+        if event.out_time is not None:
+            progress_bar.n = min(event.out_time, duration)
+        postfix = {}
+        if event.speed is not None:
+            postfix["speed"] = f"{event.speed:.2f}x"
+        if event.fps is not None:
+            postfix["fps"] = f"{event.fps:.0f}"
+        if event.bitrate is not None:
+            postfix["kbps"] = f"{event.bitrate:.0f}"
+        progress_bar.set_postfix(postfix, refresh=False)
+        progress_bar.refresh()
+    return update
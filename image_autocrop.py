@@ -1,33 +1,138 @@
 import os
 from PIL import Image
+import image_batch
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("Warning: numpy not installed. Tolerance autocrop disabled, only transparent borders are cropped. "
+          "Install with: pip install numpy")
 
-def autocrop_image(image_path, output_path):
-    with Image.open(image_path) as img:
-        # Ensure image has alpha (transparency) channel
-        if img.mode != "RGBA":
-            img = img.convert("RGBA")
+TOLERANCE = 16  # Max per-channel difference from the background still counted as background (0-255)
+ALPHA_TOLERANCE = 0  # Alpha at or below this counts as transparent
+PADDING = 0  # Pixels of margin kept around the content
+BACKGROUND = "auto"  # "auto" (detect from the border), "transparent", or an (R, G, B) tuple
+STRIP_ROWS = 64  # Rows (or columns) compared per step, so the comparison masks stay strip-sized
+
+def autocrop_legacy(img):
+    """The original transparent-only crop, kept as the fallback without numpy and for benchmarks."""
+    # Ensure image has alpha (transparency) channel
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+
+    # Get alpha channel or white pixels
+    bg = Image.new("RGBA", img.size, (255, 255, 255, 0))
+    diff = Image.alpha_composite(bg, img).getbbox()
+    return img.crop(diff) if diff else None
+
+def _channels(img):
+    """
+    Color and alpha arrays for an image.
+
+    np.asarray makes one uint8 copy of the pixels (Pillow's memory can't be shared); the color
+    and alpha arrays are views of it. Other modes are converted first, which is a second copy.
+    """
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        has_alpha = "transparency" in img.info or img.mode.endswith("A")
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    arr = np.asarray(img)
+    if arr.ndim == 2:
+        arr = arr[:, :, None]
+    if img.mode in ("RGBA", "LA"):
+        return arr[:, :, :-1], arr[:, :, -1]
+    return arr, None
+
+def detect_background(color, alpha=None, alpha_tolerance=ALPHA_TOLERANCE):
+    """
+    Guess the background from the outermost rows and columns.
+
+    Returns "transparent" if most of the border is transparent, else the median border color.
+    """
+    border = np.concatenate([color[0], color[-1], color[:, 0], color[:, -1]])
+    if alpha is not None:
+        transparent = np.concatenate([alpha[0], alpha[-1], alpha[:, 0], alpha[:, -1]]) <= alpha_tolerance
+        if transparent.mean() >= 0.5:
+            return "transparent"
+        border = border[~transparent]
+    return tuple(int(v) for v in np.median(border, axis=0))
 
-        # Get alpha channel or white pixels
-        bg = Image.new("RGBA", img.size, (255, 255, 255, 0))
-        diff = Image.alpha_composite(bg, img).getbbox()
+def content_bbox(img, tolerance=TOLERANCE, alpha_tolerance=ALPHA_TOLERANCE, background=BACKGROUND, padding=PADDING):
+    """
+    Bounding box (left, top, right, bottom) of everything that isn't background, or None.
 
-        if diff:
-            cropped = img.crop(diff)
+    A pixel is background if it is transparent (alpha <= alpha_tolerance) or, unless the
+    background is "transparent", within `tolerance` of the background color on every channel.
+    Strips are scanned inward from each edge and reduced to row/column projections, so the
+    work is proportional to the margins rather than the whole image.
+    """
+    color, alpha = _channels(img)
+    if background == "auto":
+        background = detect_background(color, alpha, alpha_tolerance)
+    height, width, channels = color.shape
+    bounds = None
+    if background != "transparent":
+        reference = np.array(background, dtype=np.int16)[:channels]
+        bounds = (np.clip(reference - tolerance, 0, 255).astype(np.uint8),
+                  np.clip(reference + tolerance, 0, 255).astype(np.uint8))
+
+    def mask(rows, cols):
+        if bounds is not None:
+            block = color[rows, cols]
+            found = ((block < bounds[0]) | (block > bounds[1])).any(axis=2)
+            if alpha is not None:
+                found &= alpha[rows, cols] > alpha_tolerance
+            return found
+        if alpha is not None:
+            return alpha[rows, cols] > alpha_tolerance
+        return np.ones((len(range(*rows.indices(height))), len(range(*cols.indices(width)))), dtype=bool)
+
+    def first(length, project, reverse=False):
+        """Index of the first line with content, scanning strips from one edge; None if none."""
+        starts = range(0, length, STRIP_ROWS)
+        for start in (reversed(starts) if reverse else starts):
+            stop = min(start + STRIP_ROWS, length)
+            hits = np.flatnonzero(project(slice(start, stop)))
+            if hits.size:
+                return start + int(hits[-1] if reverse else hits[0])
+        return None
+
+    everything = slice(0, None)
+    top = first(height, lambda rows: mask(rows, everything).any(axis=1))
+    if top is None:
+        return None
+    bottom = first(height, lambda rows: mask(rows, everything).any(axis=1), reverse=True) + 1
+    inside = slice(top, bottom)
+    left = first(width, lambda cols: mask(inside, cols).any(axis=0))
+    right = first(width, lambda cols: mask(inside, cols).any(axis=0), reverse=True) + 1
+    return (max(0, left - padding), max(0, top - padding),
+            min(width, right + padding), min(height, bottom + padding))
+
+def autocrop(img, tolerance=TOLERANCE, alpha_tolerance=ALPHA_TOLERANCE, background=BACKGROUND, padding=PADDING):
+    """Crop an in-memory image to its content (see content_bbox); None if there is none."""
+    if np is None:
+        return autocrop_legacy(img)
+    bbox = content_bbox(img, tolerance, alpha_tolerance, background, padding)
+    return img.crop(bbox) if bbox else None
+
+def autocrop_image(image_path, output_path, tolerance=TOLERANCE, alpha_tolerance=ALPHA_TOLERANCE,
+                   background=BACKGROUND, padding=PADDING):
+    with Image.open(image_path) as img:
+        cropped = autocrop(img, tolerance, alpha_tolerance, background, padding)
+        if cropped:
             cropped.save(output_path)
-        else:
-            print(f"Skipping {image_path} - no content found")
+            return output_path
+        print(f"Skipping {image_path} - no content found")
+        return None
 
 if __name__ == "__main__":
     input_folder = "/home/monk/test/"
     output_folder = "/home/monk/cropped/"
     os.makedirs(output_folder, exist_ok=True)
 
-    for image in os.listdir(input_folder):
-        if image.lower().endswith(('.png', '.jpg', '.jpeg')):
-            input_path = os.path.join(input_folder, image)
-            output_path = os.path.join(output_folder, image)
-            print(f"Cropping {image}...")
-            autocrop_image(input_path, output_path)
-
-    print("Done.")
+    images = [image for image in sorted(os.listdir(input_folder)) if image.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    print(f"Cropping {len(images)} images...")
+    settings = (TOLERANCE, ALPHA_TOLERANCE, BACKGROUND, PADDING)
+    jobs = [(os.path.join(input_folder, image), (os.path.join(output_folder, image),) + settings) for image in images]
+    results = image_batch.run_batch(autocrop_image, jobs, operation="autocrop")
 
+    print(f"Done. {sum(r['status'] == 'ok' for r in results)}/{len(results)} cropped.")
@@ -0,0 +1,137 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+import image_cache
+
+WORKERS = os.cpu_count() or 1
+CHUNK_SIZE = 8  # Files per task; fewer round trips to the workers for folders of small images
+PIXEL_BUDGET = 250_000_000  # Decoded pixels in flight across all workers (~1 GB as RGBA)
+
+def image_pixels(path):
+    """Width x height from the file header, without decoding; 0 if it can't be read."""
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+        return width * height
+    except Exception:
+        return 0
+
+def _run_chunk(func, jobs):
+    """Worker side: run func(path, *args) for each job, keeping one file's failure from stopping the rest."""
+    results = []
+    for path, args in jobs:
+        try:
+            result = func(path, *args)
+            results.append(("ok" if result is not None else "skipped", result, None))
+        except Exception as e:
+            results.append(("failed", None, f"{type(e).__name__}: {e}"))
+    return results
+
+def plan_chunks(jobs, chunk_size, pixel_budget, workers):
+    """Group consecutive jobs into chunks of at most chunk_size files and about a worker's share of pixels."""
+    share = max(1, pixel_budget // workers)
+    chunks, current, current_pixels = [], [], 0
+    for index, (path, args) in enumerate(jobs):
+        pixels = image_pixels(path)
+        if current and (len(current) >= chunk_size or current_pixels + pixels > share):
+            chunks.append((current, current_pixels))
+            current, current_pixels = [], 0
+        current.append(index)
+        current_pixels += pixels
+    if current:
+        chunks.append((current, current_pixels))
+    return chunks
+
+def run_batch(func, jobs, workers=None, chunk_size=CHUNK_SIZE, pixel_budget=PIXEL_BUDGET, initializer=None, initargs=(),
+              operation=None):
+    """
+    Run func(path, *args) for every (path, args) in `jobs` on a process pool.
+
+    `func` must be a module-level function. Chunks are only submitted while the decoded
+    pixels in flight stay under `pixel_budget`, so a folder of huge scans doesn't exhaust
+    memory. Results are printed and returned in input order as dicts with path, status
+    ("ok", "skipped" when func returned None, "failed"), result and error. If a worker
+    crashes, the pool is restarted and the affected chunks retried one file at a time, so
+    only a file that crashes on its own is failed.
+
+    With an `operation` name, jobs are checked against image_cache first: content already
+    processed with the same args (or that is itself such a result) is reported "cached"
+    without running, and finished jobs are recorded. func must then return its output path.
+    """
+    jobs = [(path, tuple(args)) for path, args in jobs]
+    results = [None] * len(jobs)
+    reported = 0
+    todo = list(range(len(jobs)))
+    input_hashes = {}
+    if operation:
+        todo = []
+        for index, (path, args) in enumerate(jobs):
+            try:
+                cached, input_hashes[index] = image_cache.check(path, operation, args)
+            except OSError as e:
+                results[index] = {"path": path, "status": "failed", "result": None, "error": str(e)}
+                continue
+            if cached:
+                results[index] = {"path": path, "status": "cached", "result": None, "error": None}
+            else:
+                todo.append(index)
+        print(f"Cache: {len(jobs) - len(todo)} of {len(jobs)} files need no work")
+    workers = max(1, min(workers or WORKERS, len(todo) or 1))
+    chunks = [([todo[i] for i in indices], pixels)
+              for indices, pixels in plan_chunks([jobs[i] for i in todo], chunk_size, pixel_budget, workers)]
+
+    def report():
+        nonlocal reported
+        while reported < len(results) and results[reported] is not None:
+            entry = results[reported]
+            reported += 1
+            line = f"[{reported}/{len(results)}] {entry['status']}: {entry['path']}"
+            print(line + (f" ({entry['error']})" if entry["error"] else ""))
+
+    # (indices, pixels, isolated); isolated chunks hold one file being retried after a crash
+    pending = [(indices, pixels, False) for indices, pixels in reversed(chunks)]
+    running = {}
+    in_flight = 0
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+    try:
+        while pending or running:
+            # Always keep one chunk going, even if it alone is over budget
+            while pending and len(running) < workers * 2 and (not running or in_flight + pending[-1][1] <= pixel_budget):
+                chunk = pending.pop()
+                indices, pixels, _ = chunk
+                future = pool.submit(_run_chunk, func, [jobs[i] for i in indices])
+                running[future] = chunk
+                in_flight += pixels
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                indices, pixels, isolated = running.pop(future)
+                in_flight -= pixels
+                try:
+                    outcomes = future.result()
+                except BrokenProcessPool as e:
+                    broken = True
+                    if not isolated:
+                        pending.extend(([i], image_pixels(jobs[i][0]), True) for i in reversed(indices))
+                        continue
+                    outcomes = [("failed", None, f"worker crashed: {e}")]
+                for index, (status, result, error) in zip(indices, outcomes):
+                    results[index] = {"path": jobs[index][0], "status": status, "result": result, "error": error}
+                    if operation and status != "failed":
+                        image_cache.record(input_hashes[index], operation, jobs[index][1], jobs[index][0], result)
+            if broken:
+                # Every chunk still queued in the dead pool is lost with it; resubmit them to a new pool
+                for future, (indices, pixels, isolated) in running.items():
+                    pending.extend(([i], image_pixels(jobs[i][0]), True) for i in reversed(indices))
+                running.clear()
+                in_flight = 0
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+            report()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        if operation:
+            image_cache.save()
+    report()
+    return results
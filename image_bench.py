@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import socket
+import argparse
+import resource
+import importlib.util
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image, ImageDraw
+import image_autocrop
+import image_converter
+
+# Synthetic image sizes (width, height); the last is a 24-megapixel photo
+SIZES = [(1500, 1000), (6000, 4000)]
+SEED = 1234  # Same pixels on every run
+ENCODE_FORMATS = ["PNG", "WEBP", "JPEG", "HEIC"]  # HEIC only if pillow_heif is installed
+CORPUS_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp', '.heic')
+
+def timed_best(func, repeat):
+    """Best wall time of `repeat` calls and the last result."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def synth_transparent(width, height):
+    """RGBA artwork: noisy content in the middle, fully transparent margins."""
+    rng = np.random.default_rng(SEED)
+    arr = np.zeros((height, width, 4), dtype=np.uint8)
+    top, left = height // 8, width // 6
+    arr[top:-top, left:-left, :3] = rng.integers(0, 256, (height - 2 * top, width - 2 * left, 3), dtype=np.uint8)
+    arr[top:-top, left:-left, 3] = 255
+    return Image.fromarray(arr, "RGBA")
+
+def synth_scan(width, height):
+    """A scanned page: near-white noisy paper around dark content, round-tripped through JPEG."""
+    rng = np.random.default_rng(SEED)
+    arr = (247 + rng.integers(-4, 5, (height, width, 3))).astype(np.uint8)
+    top, left = height // 10, width // 10
+    arr[top:-top, left:-left] = rng.integers(0, 160, (height - 2 * top, width - 2 * left, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(arr, "RGB").save(buffer, "JPEG", quality=85)
+    buffer.seek(0)
+    img = Image.open(buffer)
+    img.load()
+    return img
+
+def synth_photo(width, height):
+    """Photo-like RGB: smooth gradients from upscaled noise plus a little grain."""
+    rng = np.random.default_rng(SEED)
+    coarse = Image.fromarray(rng.integers(0, 256, (max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8))
+    arr = np.asarray(coarse.resize((width, height), Image.BICUBIC)).astype(np.int16)
+    arr += rng.integers(-6, 7, arr.shape, dtype=np.int16)
+    return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8), "RGB")
+
+def synth_graphic(width, height):
+    """Flat-color RGBA artwork: shapes and lines on a transparent background, like icons or UI."""
+    rng = np.random.default_rng(SEED)
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for _ in range(200):
+        x0, x1 = sorted(rng.integers(0, width, 2))
+        y0, y1 = sorted(rng.integers(0, height, 2))
+        color = tuple(int(v) for v in rng.integers(0, 256, 3)) + (255,)
+        if rng.random() < 0.5:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+        else:
+            draw.line((x0, y0, x1, y1), fill=color, width=max(1, width // 300))
+    return img
+
+def synth_product(width, height):
+    """A product shot: a soft-edged colored object with a highlight on a light studio gradient."""
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    backdrop = (235 - 30 * y) * np.ones((1, width, 3), dtype=np.float32)
+    img = Image.fromarray(backdrop.astype(np.uint8), "RGB")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((width * 0.3, height * 0.2, width * 0.7, height * 0.85), fill=(150, 40, 50))
+    draw.rectangle((width * 0.46, height * 0.08, width * 0.54, height * 0.25), fill=(60, 60, 70))
+    draw.ellipse((width * 0.38, height * 0.3, width * 0.46, height * 0.42), fill=(230, 170, 170))
+    return img
+
+def load_corpus(folder):
+    """(name, image) for every image in `folder`, fully decoded."""
+    images = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(CORPUS_EXTENSIONS):
+            img = Image.open(os.path.join(folder, name))
+            img.load()
+            images.append((os.path.splitext(name)[0], img))
+    return images
+
+def cases(sizes, makers, corpus):
+    """(case name, image) pairs: the corpus images if given, else every maker at every size."""
+    if corpus:
+        yield from corpus
+        return
+    for width, height in sizes:
+        for name, make in makers:
+            yield f"{name}_{width}x{height}", make(width, height)
+
+def bench_autocrop(sizes, repeat, corpus=None):
+    """The numpy tolerance engine against the original alpha_composite + getbbox crop."""
+    results = []
+    for case, img in cases(sizes, (("transparent", synth_transparent), ("scan", synth_scan)), corpus):
+        for engine, crop in (("legacy", image_autocrop.autocrop_legacy), ("numpy", image_autocrop.autocrop)):
+            seconds, cropped = timed_best(lambda: crop(img), repeat)
+            results.append({
+                "bench": "autocrop",
+                "case": case,
+                "engine": engine,
+                "seconds": round(seconds, 4),
+                "output": list(cropped.size) if cropped else None,
+            })
+    return results
+
+def bench_encode(sizes, repeat, corpus=None):
+    """Encode time and bytes for every image_converter profile (and Pillow's defaults) per format."""
+    Image.init()  # Registers every plugin, so Image.SAVE lists what this install can write
+    formats = [fmt for fmt in ENCODE_FORMATS if image_converter.SAVE_NAMES.get(fmt, fmt) in Image.SAVE]
+    results = []
+    for case, img in cases(sizes, (("photo", synth_photo), ("graphic", synth_graphic)), corpus):
+        for fmt in formats:
+            for profile in [None] + list(image_converter.PROFILES):
+                def encode():
+                    buffer = BytesIO()
+                    image_converter.save_image(img, buffer, fmt, profile=profile)
+                    return buffer.tell()
+                seconds, size = timed_best(encode, repeat)
+                results.append({
+                    "bench": "encode",
+                    "case": f"{case}_{fmt.lower()}",
+                    "engine": profile or "default",
+                    "seconds": round(seconds, 4),
+                    "output": size,
+                })
+    return results
+
+def _measure_nobg(img, mask_size, repeat):
+    """
+    Run in a fresh process: best time of cut_background, the peak memory (MB) it added on top
+    of the loaded model, and a 256 px alpha thumbnail for comparing cutouts.
+    """
+    import image_invisible_background
+    image_invisible_background.cut_background(img.resize((64, 64)))  # Load the model before measuring
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    seconds, output = timed_best(lambda: image_invisible_background.cut_background(img, mask_size=mask_size), repeat)
+    peak_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) // 1024  # ru_maxrss is KB on Linux
+    alpha = output.getchannel("A")
+    alpha.thumbnail((256, 256))
+    return seconds, peak_mb, np.asarray(alpha)
+
+def bench_nobg(sizes, repeat, corpus=None):
+    """rembg on the full-size image against low-res mask inference plus guided-filter refinement."""
+    if importlib.util.find_spec("rembg") is None:
+        print("rembg not installed, skipping the nobg bench")
+        return []
+    import image_invisible_background
+    results = []
+    context = multiprocessing.get_context("spawn")  # A clean process per run, so peak memory is its own
+    for case, img in cases(sizes, (("product", synth_product),), corpus):
+        reference = None
+        for engine, mask_size in (("full", None), ("lowres", image_invisible_background.MASK_SIZE)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                seconds, peak_mb, alpha = pool.submit(_measure_nobg, img, mask_size, repeat).result()
+            if reference is None:
+                reference = alpha.astype(np.float32)
+            results.append({
+                "bench": "nobg",
+                "case": case,
+                "engine": engine,
+                "seconds": round(seconds, 4),
+                # Mean alpha difference (0-255) from the full-size cutout
+                "output": {"peak_mb": peak_mb, "alpha_diff": round(float(np.abs(alpha - reference).mean()), 2)},
+            })
+    return results
+
+BENCHES = {
+    "autocrop": bench_autocrop,
+    "encode": bench_encode,
+    "nobg": bench_nobg,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the image tools on synthetic images.")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHES), help="Benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the best time is kept")
+    parser.add_argument("--quick", action="store_true", help="Only the smallest size")
+    parser.add_argument("--corpus", help="Folder of sample images to use instead of the synthetic ones")
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    sizes = SIZES[:1] if args.quick else SIZES
+    corpus = load_corpus(args.corpus) if args.corpus else None
+    results = []
+    for name in args.only or list(BENCHES):
+        for entry in BENCHES[name](sizes, args.repeat, corpus):
+            results.append(entry)
+            print(f"{entry['bench']:10} {entry['case']:28} {entry['engine']:10} {entry['seconds']:8.4f}s  -> {entry['output']}")
+    if args.output:
+        report = {
+            "host": socket.gethostname(),
+            "cpu_count": os.cpu_count(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
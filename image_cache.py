@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+import json_store
+
+# Manifest of finished image jobs, keyed by input content hash + operation + parameters
+CACHE_DIR = json_store.CACHE_DIR
+MANIFEST_PATH = os.path.join(CACHE_DIR, "image_manifest.json")
+MAX_ENTRIES = 200000  # Per section; least recently used jobs (hit or recorded) are dropped first
+
+_lock = threading.Lock()
+_manifest = None
+
+def _load():
+    global _manifest
+    if _manifest is None:
+        _manifest = json_store.read(MANIFEST_PATH)
+        _manifest.setdefault("jobs", {})
+        _manifest.setdefault("hashes", {})
+    return _manifest
+
+def save():
+    """Merge with whatever other processes wrote since we loaded, then replace atomically."""
+    with _lock:
+        if _manifest is None:
+            return
+        # Another process may have used an entry more recently than we did; jobs are dropped least
+        # recently used first, file hashes (no "used") oldest first
+        json_store.merge(MANIFEST_PATH, _manifest, MAX_ENTRIES, used=_used)
+
+def _used(entry):
+    return entry.get("used", 0) if isinstance(entry, dict) else 0
+
+def _touch(key):
+    """Mark a job entry as used now, so LRU trimming and --older-than keep entries that keep hitting."""
+    with _lock:
+        entry = _load()["jobs"].get(key)
+        if entry:
+            entry["used"] = time.time()
+
+def file_hash(path):
+    """SHA-256 of the file's content; unchanged files (same path, size, mtime) are not re-read."""
+    stat = os.stat(path)
+    stat_key = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    with _lock:
+        known = _load()["hashes"].get(stat_key)
+    if known:
+        return known
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    with _lock:
+        _load()["hashes"][stat_key] = digest.hexdigest()
+    return digest.hexdigest()
+
+def job_key(content_hash, operation, params):
+    """Key for running `operation` with `params` (JSON-able) on content with this hash."""
+    blob = json.dumps([content_hash, operation, list(params)], sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def check(path, operation, params):
+    """
+    Return (cached, input_hash) for running `operation` with `params` on `path`.
+
+    It is cached if this content was already processed and the recorded output is still intact,
+    or if this content is itself that job's output (an in-place result from an earlier run).
+    """
+    content_hash = file_hash(path)
+    key = job_key(content_hash, operation, params)
+    with _lock:
+        entry = _load()["jobs"].get(key)
+    if not entry:
+        return False, content_hash
+    if entry.get("produced"):
+        _touch(key)
+        return True, content_hash
+    output = entry.get("output")
+    if output is None:
+        _touch(key)
+        return True, content_hash  # The tool had nothing to write for this content last time
+    cached = os.path.exists(output) and file_hash(output) == entry.get("output_hash")
+    if cached:
+        _touch(key)
+    return cached, content_hash
+
+def record(input_hash, operation, params, input_path, output_path):
+    """Record a finished job; output_path is None when the tool wrote nothing."""
+    now = time.time()
+    output_hash = file_hash(output_path) if output_path and os.path.exists(output_path) else None
+    with _lock:
+        jobs = _load()["jobs"]
+        key = job_key(input_hash, operation, params)
+        jobs.pop(key, None)
+        jobs[key] = {
+            "input": os.path.abspath(input_path),
+            "output": os.path.abspath(output_path) if output_hash else None,
+            "output_hash": output_hash,
+            "operation": operation,
+            "used": now,
+        }
+        if output_hash:
+            # Mark the result itself, so running the same job on it (e.g. in place) is a no-op
+            produced = job_key(output_hash, operation, params)
+            jobs.pop(produced, None)
+            jobs[produced] = {"produced": True, "output": os.path.abspath(output_path), "operation": operation,
+                              "used": now}
+
+def evict(older_than_days=None, missing=False, operation=None):
+    """
+    Drop manifest entries, returning how many were removed.
+
+    older_than_days: not used for that long. missing: their output file is gone.
+    operation: limit to one operation. With no criteria, everything (of that operation) goes.
+    """
+    global _manifest
+    cutoff = time.time() - older_than_days * 86400 if older_than_days is not None else None
+    with _lock:
+        manifest = json_store.read(MANIFEST_PATH)
+        jobs = manifest.get("jobs", {})
+        removed = 0
+        for key in list(jobs):
+            entry = jobs[key]
+            if operation and entry.get("operation") != operation:
+                continue
+            stale = cutoff is not None and entry.get("used", 0) < cutoff
+            gone = missing and entry.get("output") and not os.path.exists(entry["output"])
+            if stale or gone or (cutoff is None and not missing):
+                del jobs[key]
+                removed += 1
+        if cutoff is None and not missing and not operation:
+            manifest["hashes"] = {}
+        elif missing:
+            manifest["hashes"] = {
+                key: value for key, value in manifest.get("hashes", {}).items()
+                if os.path.exists(key.rsplit("|", 2)[0])
+            }
+        json_store.write(MANIFEST_PATH, manifest)
+        _manifest = None
+    return removed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or evict the image tools' output cache.")
+    parser.add_argument("--older-than", type=float, metavar="DAYS", help="Evict entries not used for DAYS days")
+    parser.add_argument("--missing", action="store_true", help="Evict entries whose output file no longer exists")
+    parser.add_argument("--operation", help="Only touch entries of this operation (e.g. shrink)")
+    parser.add_argument("--clear", action="store_true", help="Evict everything")
+    args = parser.parse_args()
+
+    if args.clear or args.older_than is not None or args.missing:
+        removed = evict(args.older_than, args.missing, args.operation)
+        print(f"Evicted {removed} entries from {MANIFEST_PATH}")
+    else:
+        manifest = json_store.read(MANIFEST_PATH)
+        jobs = manifest.get("jobs", {})
+        counts = {}
+        for entry in jobs.values():
+            counts[entry.get("operation")] = counts.get(entry.get("operation"), 0) + 1
+        print(f"{MANIFEST_PATH}: {len(jobs)} jobs, {len(manifest.get('hashes', {}))} file hashes")
+        for operation, count in sorted(counts.items(), key=lambda item: str(item[0])):
+            print(f"  {operation}: {count}")
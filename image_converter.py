@@ -1,5 +1,7 @@
 from PIL import Image
 import os
+import image_inventory
+import image_shrink
 try:
     from pillow_heif import register_heif_opener
     register_heif_opener()  # Enable HEIC input/output support
@@ -8,6 +10,35 @@ except ImportError:
 
 # Global variable to specify output format
 TYPE = "PNG"  # Options: HEIC, ICO, PNG, JPEG, BMP, GIF, TIFF, WEBP, etc.
+EXPORT_TYPES = []  # e.g. ["ICO", "PNG", "WEBP"] to write several formats from one decode (overrides TYPE)
+ICO_SIZES = [(16, 16), (32, 32), (64, 64), (256, 256)]
+SET_SIZES = []  # e.g. [(32, 32), (180, 180), (192, 192), (512, 512)]: also write <name>-<w>x<h>.<ext> for non-ICO types
+PROFILE = None  # Encoder profile from PROFILES ("fast", "balanced", "smallest"), or None for Pillow's defaults
+
+# Encoder options per profile and format; formats not listed use Pillow's defaults.
+# "fast" and "balanced" keep each encoder's default quality (JPEG 75, WEBP 80, pillow_heif 50)
+# and only change effort; "smallest" adds the most effort and, for WEBP and HEIC, a slightly
+# lower quality. Run image_bench.py --only encode to see the trade-off on your images.
+PROFILES = {
+    "fast": {
+        "PNG": {"compress_level": 1},
+        "WEBP": {"quality": 80, "method": 0, "lossless": False},
+        "JPEG": {"quality": 75, "optimize": False, "progressive": False},
+        "HEIC": {"quality": 50},
+    },
+    "balanced": {
+        "PNG": {"compress_level": 6},
+        "WEBP": {"quality": 80, "method": 4, "lossless": False},
+        "JPEG": {"quality": 75, "optimize": True, "progressive": False, "subsampling": "4:2:0"},
+        "HEIC": {"quality": 50},
+    },
+    "smallest": {
+        "PNG": {"compress_level": 9, "optimize": True},
+        "WEBP": {"quality": 75, "method": 6, "lossless": False},
+        "JPEG": {"quality": 75, "optimize": True, "progressive": True, "subsampling": "4:2:0"},
+        "HEIC": {"quality": 45},
+    },
+}
 
 # Supported output formats and their extensions
 SUPPORTED_FORMATS = {
@@ -20,53 +51,116 @@ SUPPORTED_FORMATS = {
     "TIFF": "tiff",
     "WEBP": "webp"
 }
+# Names Pillow reports for a file that are a SUPPORTED_FORMATS key under another name
+FORMAT_ALIASES = {"HEIF": "HEIC", "MPO": "JPEG"}
+# Pillow's writer name where it differs from the SUPPORTED_FORMATS key (pillow_heif registers HEIF)
+SAVE_NAMES = {"HEIC": "HEIF"}
 
-def convert_image(input_path, output_format, output_dir=".", ico_sizes=[(16, 16), (32, 32), (64, 64), (256, 256)]):
+def size_ladder(img, sizes):
     """
-    Convert an input image to the specified output format.
+    Resized copies of `img` for every size, as {size: image}.
+
+    Sizes are made largest first, each from the next larger one, so only the first resample
+    touches the full-resolution source (and a large source is first cut down with reduce(),
+    see image_shrink.downscale).
     """
-    output_format = output_format.upper()
-    if output_format not in SUPPORTED_FORMATS:
-        print(f"Error: Unsupported output format '{output_format}'. Choose from {list(SUPPORTED_FORMATS.keys())}")
-        return None
-    
-    output_ext = SUPPORTED_FORMATS[output_format]
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        img = img.convert("RGBA")  # Palette images can't be resampled smoothly
+    ladder = {}
+    current = img
+    for size in sorted(set(sizes), key=lambda size: size[0] * size[1], reverse=True):
+        current = image_shrink.downscale(current, size)
+        ladder[size] = current
+    return ladder
+
+def save_image(img, output_path, output_format, ico_sizes=ICO_SIZES, ladder=None, profile=PROFILE):
+    """
+    Encode an in-memory image to `output_path` in `output_format` (a SUPPORTED_FORMATS key).
+
+    For ICO, `ladder` (from size_ladder) supplies the already resized icon images.
+    `profile` picks encoder options from PROFILES.
+    """
+    if profile is not None and profile not in PROFILES:
+        raise ValueError(f"Unknown profile '{profile}'. Choose from {list(PROFILES)}")
+    options = PROFILES[profile].get(output_format, {}) if profile else {}
+
+    # Convert to appropriate mode if needed
+    if output_format in ["JPEG", "BMP"] and img.mode not in ["RGB", "L"]:
+        img = img.convert("RGB")
+    elif output_format == "ICO" and img.mode != "RGBA":
+        img = img.convert("RGBA")  # ICO prefers RGBA
+    elif output_format == "HEIC" and img.mode not in ["RGB", "RGBA"]:
+        img = img.convert("RGB")  # HEIC typically uses RGB
+
+    # Handle ICO specifically
+    if output_format == "ICO":
+        ladder = ladder or size_ladder(img, ico_sizes)
+        images = [ladder[size].convert("RGBA") for size in sorted(set(ico_sizes), reverse=True)]
+        # Every size is stored from its own image instead of being resized again from the first
+        images[0].save(
+            output_path,
+            format="ICO",
+            bitmap_format="bmp",  # Reliable for ICO
+            sizes=[image.size for image in images],
+            append_images=images[1:]
+        )
+    else:
+        # Save other formats, including HEIC
+        img.save(output_path, format=SAVE_NAMES.get(output_format, output_format), **options)
+
+def output_name(input_path, output_dir, ext, suffix=""):
+    """<output_dir>/<input base name><suffix>.<ext>, with _converted added if that is the input itself."""
     base_name = os.path.splitext(os.path.basename(input_path))[0]
-    output_path = os.path.join(output_dir, f"output_image.{output_ext}")
-    
+    output_path = os.path.join(output_dir, f"{base_name}{suffix}.{ext}")
+    if os.path.abspath(output_path) == os.path.abspath(input_path):
+        output_path = os.path.join(output_dir, f"{base_name}{suffix}_converted.{ext}")
+    return output_path
+
+def export_image(input_path, output_formats, output_dir=".", ico_sizes=ICO_SIZES, set_sizes=SET_SIZES,
+                 profile=PROFILE):
+    """
+    Decode `input_path` once and write it in every format of `output_formats`.
+
+    ICO gets all `ico_sizes` in one file; other formats are written at full size plus one
+    <name>-<w>x<h> file per `set_sizes` entry. All sizes come from one shared size_ladder.
+    Returns the written paths, or None on error.
+    """
+    output_formats = [output_format.upper() for output_format in output_formats]
+    for output_format in output_formats:
+        if output_format not in SUPPORTED_FORMATS:
+            print(f"Error: Unsupported output format '{output_format}'. Choose from {list(SUPPORTED_FORMATS.keys())}")
+            return None
+    os.makedirs(output_dir, exist_ok=True)
+
     try:
         # Open and validate input image
         with Image.open(input_path) as img:
-            input_format = img.format
-            print(f"Detected input format: {input_format}")
-            
-            # Convert to appropriate mode if needed
-            if output_format in ["JPEG", "BMP"] and img.mode not in ["RGB", "L"]:
-                img = img.convert("RGB")
-            elif output_format == "ICO" and img.mode != "RGBA":
-                img = img.convert("RGBA")  # ICO prefers RGBA
-            elif output_format == "HEIC" and img.mode not in ["RGB", "RGBA"]:
-                img = img.convert("RGB")  # HEIC typically uses RGB
-            
-            # Handle ICO specifically
-            if output_format == "ICO":
-                images = []
-                for size in ico_sizes:
-                    resized_img = img.resize(size, Image.Resampling.LANCZOS)
-                    images.append(resized_img)
-                images[0].save(
-                    output_path,
-                    format="ICO",
-                    bitmap_format="bmp",  # Reliable for ICO
-                    sizes=ico_sizes
-                )
-            else:
-                # Save other formats, including HEIC
-                img.save(output_path, format=output_format)
-            
-            print(f"Successfully created {output_path}")
-            return output_path
-            
+            print(f"Detected input format: {img.format}")
+            sizes = list(ico_sizes) if "ICO" in output_formats else []
+            if any(output_format != "ICO" for output_format in output_formats):
+                sizes += set_sizes
+            elif sizes:
+                # Only icons are wanted, so a JPEG can be decoded at reduced size
+                largest = max(sizes, key=lambda size: size[0] * size[1])
+                img.draft(img.mode, (largest[0] * 2, largest[1] * 2))
+            img.load()
+            ladder = size_ladder(img, sizes)
+
+            outputs = []
+            for output_format in output_formats:
+                ext = SUPPORTED_FORMATS[output_format]
+                output_path = output_name(input_path, output_dir, ext)
+                save_image(img, output_path, output_format, ico_sizes, ladder, profile)
+                outputs.append(output_path)
+                if output_format != "ICO":
+                    for size in set_sizes:
+                        output_path = output_name(input_path, output_dir, ext, f"-{size[0]}x{size[1]}")
+                        save_image(ladder[size], output_path, output_format, profile=profile)
+                        outputs.append(output_path)
+            for output_path in outputs:
+                print(f"Successfully created {output_path}")
+            return outputs
+
     except FileNotFoundError:
         print(f"Error: Input file '{input_path}' not found.")
         return None
@@ -74,6 +168,13 @@ def convert_image(input_path, output_format, output_dir=".", ico_sizes=[(16, 16)
         print(f"Error during conversion: {e}")
         return None
 
+def convert_image(input_path, output_format, output_dir=".", ico_sizes=ICO_SIZES, profile=PROFILE):
+    """
+    Convert an input image to the specified output format.
+    """
+    outputs = export_image(input_path, [output_format], output_dir, ico_sizes, set_sizes=[], profile=profile)
+    return outputs[0] if outputs else None
+
 if __name__ == "__main__":
     input_file = None
     # Look for input_image with any extension, including HEIC
@@ -85,7 +186,14 @@ if __name__ == "__main__":
     
     if input_file:
         print(f"Found input file: {input_file}")
-        result = convert_image(input_file, TYPE)
+        header = image_inventory.read_header(input_file)
+        if EXPORT_TYPES:
+            result = export_image(input_file, EXPORT_TYPES, profile=PROFILE)
+        elif header and FORMAT_ALIASES.get(header["format"], header["format"]) == TYPE.upper():
+            print(f"{input_file} is already {TYPE}, nothing to convert")
+            result = input_file
+        else:
+            result = convert_image(input_file, TYPE, profile=PROFILE)
         if result:
             print(f"Conversion complete: {result}")
         else:
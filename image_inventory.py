@@ -0,0 +1,144 @@
+import os
+import argparse
+from PIL import Image
+import json_store
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()  # HEIC headers
+except ImportError:
+    pass  # HEIC files are listed without a header; the tools report them when they open them
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.tif', '.webp', '.heic', '.ico')
+# Headers already read, keyed by absolute path and trusted while size and mtime are unchanged
+INVENTORY_PATH = os.path.join(json_store.CACHE_DIR, "image_inventory.json")
+ORIENTATION_TAG = 0x0112  # EXIF orientation; 5-8 mean the image is displayed rotated by 90 degrees
+
+def _orientation(img):
+    """EXIF orientation from what Image.open already read; 1 if there is none."""
+    if img.format == "PNG":
+        # PngImageFile.getexif() decodes the whole image to look for an eXIf chunk after the pixels,
+        # so only an eXIf chunk found ahead of them (in img.info) is used
+        exif = Image.Exif()
+        if img.info.get("exif"):
+            exif.load(img.info["exif"])
+        return exif.get(ORIENTATION_TAG, 1)
+    return img.getexif().get(ORIENTATION_TAG, 1)
+
+def read_header(path):
+    """
+    Width, height, mode, format and EXIF orientation of an image without decoding its pixels.
+
+    Returns None if the file can't be identified as an image.
+    """
+    try:
+        with Image.open(path) as img:
+            return {
+                "width": img.width,
+                "height": img.height,
+                "mode": img.mode,
+                "format": img.format,
+                "orientation": _orientation(img),
+            }
+    except Exception:
+        return None
+
+def display_size(entry):
+    """(width, height) as viewers show the image, i.e. with the EXIF orientation applied."""
+    if entry["orientation"] in (5, 6, 7, 8):
+        return entry["height"], entry["width"]
+    return entry["width"], entry["height"]
+
+def iter_files(root, extensions=IMAGE_EXTENSIONS, recursive=True):
+    """Yield (path, stat) for every file under `root` with one of `extensions`, using os.scandir."""
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Can't list {folder}: {e}")
+            continue
+        subfolders = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    subfolders.append(entry.path)
+            elif entry.name.lower().endswith(extensions):
+                try:
+                    yield entry.path, entry.stat()
+                except OSError:
+                    continue
+        stack.extend(reversed(subfolders))
+
+def _save_inventory(inventory):
+    try:
+        json_store.write(INVENTORY_PATH, inventory)
+    except OSError as e:
+        print(f"Inventory write error: {e}")
+
+def scan(root, extensions=IMAGE_EXTENSIONS, recursive=True, where=None):
+    """
+    List the images under `root` as dicts: path, bytes, mtime_ns, width, height, mode, format,
+    orientation (the header fields are None for files that aren't readable images).
+
+    Only new or changed files have their header read; the rest come from the inventory cache.
+    With `where`, only entries for which where(entry) is true are returned.
+    """
+    inventory = json_store.read(INVENTORY_PATH)
+    prefix = os.path.join(os.path.abspath(root), "")
+    seen = set()
+    entries = []
+    changed = False
+    for path, stat in iter_files(root, extensions, recursive):
+        key = os.path.abspath(path)
+        seen.add(key)
+        entry = inventory.get(key)
+        if not entry or entry["bytes"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            header = read_header(path) or dict.fromkeys(("width", "height", "mode", "format", "orientation"))
+            entry = {"bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns, **header}
+            inventory[key] = entry
+            changed = True
+        entries.append({"path": path, **entry})
+    # Forget files under this root that are gone (only the folders actually scanned)
+    for key in list(inventory):
+        if (key.startswith(prefix) and key not in seen and key.lower().endswith(extensions)
+                and (recursive or os.path.dirname(key) == prefix[:-1])):
+            del inventory[key]
+            changed = True
+    if changed:
+        _save_inventory(inventory)
+    return [entry for entry in entries if where is None or where(entry)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List images under a folder from their headers only, cached between runs.")
+    parser.add_argument("root", nargs="?", default=".", help="Folder to scan (default: current folder)")
+    parser.add_argument("--no-recursive", action="store_true", help="Don't descend into subfolders")
+    parser.add_argument("--format", help="Only images in this format (e.g. JPEG)")
+    parser.add_argument("--not-format", help="Only images not in this format")
+    parser.add_argument("--min-size", type=int, metavar="PX", help="Only images whose longer side is at least PX")
+    parser.add_argument("--not-square", action="store_true", help="Only images that aren't square")
+    parser.add_argument("--rotated", action="store_true", help="Only images with an EXIF orientation other than 1")
+    args = parser.parse_args()
+
+    def where(entry):
+        if entry["format"] is None:
+            return False
+        if args.format and entry["format"] != args.format.upper():
+            return False
+        if args.not_format and entry["format"] == args.not_format.upper():
+            return False
+        if args.min_size and max(entry["width"], entry["height"]) < args.min_size:
+            return False
+        if args.not_square and entry["width"] == entry["height"]:
+            return False
+        if args.rotated and entry["orientation"] == 1:
+            return False
+        return True
+
+    entries = scan(args.root, recursive=not args.no_recursive, where=where)
+    for entry in entries:
+        width, height = display_size(entry)
+        print(f"{entry['path']}  {width}x{height}  {entry['mode']}  {entry['format']}"
+              + (f"  (EXIF orientation {entry['orientation']})" if entry["orientation"] != 1 else ""))
+    print(f"{len(entries)} images")
@@ -0,0 +1,134 @@
+import os
+import argparse
+from PIL import Image
+import image_autocrop
+import square_image
+import image_shrink
+import image_converter
+
+# Steps run in order on one decoded image, which is then encoded once.
+# Each step is "name" or "name=argument":
+#   autocrop            crop to the content (transparent or near-uniform border, see image_autocrop)
+#   square              center-crop to a square
+#   shrink=WxH[:mode]   resize to W x H; mode is stretch (default), fit or fill (see image_shrink)
+#   nobg                make the background transparent (needs rembg)
+#   convert=FORMAT      output format, one of image_converter.SUPPORTED_FORMATS
+STEPS = ["autocrop", "square", "shrink=64x64", "convert=PNG"]
+INPUT_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.webp', '.heic')
+
+def _shrink_args(argument):
+    dims, _, mode = argument.lower().partition(":")
+    width, _, height = dims.partition("x")
+    mode = mode or "stretch"
+    if mode not in image_shrink.MODES:
+        raise ValueError(mode)
+    return (int(width), int(height or width)), mode
+
+def _cut_background(img, _):
+    import image_invisible_background  # rembg is slow to import and optional for the other steps
+    return image_invisible_background.cut_background(img)
+
+# name -> (operation(img, argument) -> image or None, argument parser)
+OPERATIONS = {
+    "autocrop": (lambda img, _: image_autocrop.autocrop(img), None),
+    "square": (lambda img, _: square_image.square(img), None),
+    "shrink": (lambda img, args: image_shrink.shrink(img, *args, fast=True), _shrink_args),
+    "nobg": (_cut_background, None),
+}
+
+def parse_steps(steps):
+    """
+    Turn step strings into (name, argument) pairs, checking every name and argument up front.
+
+    Raises ValueError for an unknown step or a bad argument.
+    """
+    parsed = []
+    for step in steps:
+        name, _, argument = step.partition("=")
+        name = name.strip().lower()
+        if name == "convert":
+            argument = argument.upper()
+            if argument not in image_converter.SUPPORTED_FORMATS:
+                raise ValueError(f"Unsupported output format '{argument}'. "
+                                 f"Choose from {list(image_converter.SUPPORTED_FORMATS.keys())}")
+            parsed.append((name, argument))
+            continue
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown step '{name}'. Choose from {list(OPERATIONS) + ['convert']}")
+        parser = OPERATIONS[name][1]
+        if parser and not argument:
+            raise ValueError(f"Step '{name}' needs an argument, e.g. {name}=64x64")
+        try:
+            parsed.append((name, parser(argument) if parser else None))
+        except ValueError:
+            raise ValueError(f"Bad argument '{argument}' for step '{name}'")
+    return parsed
+
+def run_pipeline(image_path, steps, output_dir="processed", profile=None):
+    """
+    Decode `image_path` once, apply `steps` (from parse_steps) in memory and encode the result once.
+
+    The output keeps the input's base name; its format is the last convert step, or the
+    input's format, encoded with `profile` (see image_converter.PROFILES). Returns the output
+    path, or None if a step found nothing to keep.
+    """
+    with Image.open(image_path) as img:
+        output_format = img.format if img.format in image_converter.SUPPORTED_FORMATS else "PNG"
+        if steps and steps[0][0] == "shrink":
+            # Nothing needs full resolution before the shrink, so let a JPEG decode at reduced size
+            size, mode = steps[0][1]
+            target = image_shrink.resize_dims(img.size, size, mode)
+            img.draft(img.mode, (target[0] * image_shrink.FAST_OVERSAMPLE, target[1] * image_shrink.FAST_OVERSAMPLE))
+        img.load()
+        for name, argument in steps:
+            if name == "convert":
+                output_format = argument
+                continue
+            img = OPERATIONS[name][0](img, argument)
+            if img is None:
+                print(f"Skipping {image_path} - {name} left nothing")
+                return None
+
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    output_path = os.path.join(output_dir, f"{base_name}.{image_converter.SUPPORTED_FORMATS[output_format]}")
+    os.makedirs(output_dir, exist_ok=True)
+    image_converter.save_image(img, output_path, output_format, profile=profile)
+    return output_path
+
+def collect_images(inputs):
+    """Expand files and folders into image paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            names = sorted(os.listdir(item))
+            paths.extend(os.path.join(item, name) for name in names if name.lower().endswith(INPUT_EXTENSIONS))
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            print(f"Not found: {item}")
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run several image operations with one decode and one encode per image.")
+    parser.add_argument("inputs", nargs="*", default=["."], help="Images or folders (default: current folder)")
+    parser.add_argument("--steps", nargs="+", default=STEPS,
+                        help=f"Steps in order (default: {' '.join(STEPS)})")
+    parser.add_argument("--output-dir", default="processed", help="Where results go (default: processed)")
+    parser.add_argument("--profile", choices=list(image_converter.PROFILES),
+                        help="Encoder speed/size profile (default: Pillow's defaults)")
+    args = parser.parse_args()
+
+    try:
+        steps = parse_steps(args.steps)
+    except ValueError as e:
+        parser.error(str(e))
+
+    count = 0
+    for path in collect_images(args.inputs):
+        print(f"Processing {path}...")
+        try:
+            if run_pipeline(path, steps, args.output_dir, args.profile):
+                count += 1
+        except Exception as e:
+            print(f"Error on {path}: {e}")
+    print(f"Done. Processed {count} images.")
@@ -1,19 +1,80 @@
-import os
 from PIL import Image
+import image_batch
+import image_inventory
 
-def shrink_image(image_path, size=(32, 32)):
+# How `size` is applied:
+#   stretch  exactly size, ignoring aspect ratio (the original behaviour)
+#   fit      largest size that fits inside `size`, keeping aspect ratio
+#   fill     smallest size that covers `size`, keeping aspect ratio, then center-cropped to `size`
+MODES = ("stretch", "fit", "fill")
+FAST_OVERSAMPLE = 2  # Fast mode decodes to about this multiple of the output size before the final resample
+
+def resize_dims(source, size, mode="stretch"):
+    """Dimensions to resample `source` (w, h) to, before any fill crop."""
+    width, height = source
+    if mode == "stretch":
+        return size
+    scale = min(size[0] / width, size[1] / height) if mode == "fit" else max(size[0] / width, size[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def already_sized(source, size, mode="stretch"):
+    """True if an image of `source` (w, h) would come out of `mode` unchanged."""
+    return tuple(source) == tuple(resize_dims(source, size, mode)) and (mode == "fit" or tuple(source) == tuple(size))
+
+def downscale(img, size, oversample=FAST_OVERSAMPLE):
+    """
+    `img` resampled to `size` (w, h) with LANCZOS, after reduce() has cut it down by the largest
+    integer factor that still leaves `oversample` x `size`, so LANCZOS works on far fewer pixels.
+    """
+    if img.mode in ("1", "P", "PA"):
+        # reduce() can't average palette indices; converting also gives LANCZOS real colors to work with
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode == "PA" else "RGB")
+    elif img.mode.startswith("I;16"):
+        img = img.convert("I")  # reduce() has no 16-bit integer modes
+    factor = min(img.width // (size[0] * oversample), img.height // (size[1] * oversample))
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img.resize(size, Image.LANCZOS)
+
+def shrink(img, size=(32, 32), mode="stretch", fast=False):
+    """
+    Resize an in-memory image to `size` using `mode`.
+
+    With `fast`, the image is first reduced by an integer factor to about FAST_OVERSAMPLE x
+    the output size (see downscale), so the LANCZOS pass works on far fewer pixels.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}'. Choose from {MODES}")
+    target = resize_dims(img.size, size, mode)
+    img = downscale(img, target) if fast else img.resize(target, Image.LANCZOS)
+    if mode == "fill":
+        left = (img.width - size[0]) // 2
+        top = (img.height - size[1]) // 2
+        img = img.crop((left, top, left + size[0], top + size[1]))
+    return img
+
+def shrink_image(image_path, size=(32, 32), mode="stretch", fast=False):
     with Image.open(image_path) as img:
-        img = img.resize(size, Image.LANCZOS)
+        if fast:
+            # JPEG only: let the decoder scale down in the DCT domain; a no-op for other formats
+            target = resize_dims(img.size, size, mode)
+            img.draft(img.mode, (target[0] * FAST_OVERSAMPLE, target[1] * FAST_OVERSAMPLE))
+        img = shrink(img, size, mode, fast)
         img.save(image_path)
+    return image_path
 
 if __name__ == "__main__":
     folder  = "/home/monk/Repos/pctoolbelt/"
     size    = (64, 117)  # define size here
+    mode    = "stretch"  # stretch, fit or fill
+    fast    = True  # decode at reduced resolution first
 
-    for image in os.listdir(folder):
-        if image.lower().endswith(('.png', '.jpg', '.jpeg')):
-            path = os.path.join(folder, image)
-            print(f"Shrinking {image} to {size[0]}x{size[1]}...")
-            shrink_image(path, size)
-    print("Done.")
-
+    # Headers only: files already at the target size are dropped before anything is decoded or hashed
+    entries = image_inventory.scan(folder, ('.png', '.jpg', '.jpeg'), recursive=False)
+    images = [entry["path"] for entry in entries
+              if entry["format"] is None or not already_sized((entry["width"], entry["height"]), size, mode)]
+    print(f"Shrinking {len(images)} images to {size[0]}x{size[1]} ({mode}), {len(entries) - len(images)} already done...")
+    jobs = [(image, (size, mode, fast)) for image in images]
+    # Shrinking is done in place; the cache keeps a rerun from shrinking its own outputs again
+    results = image_batch.run_batch(shrink_image, jobs, operation="shrink")
+    print(f"Done. {sum(r['status'] == 'ok' for r in results)}/{len(results)} shrunk.")
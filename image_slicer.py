@@ -1,48 +1,226 @@
 from PIL import Image
 import os
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import image_converter
 
-def slice_image_grid(input_image_path, slices_x, slices_y):
-    # Output directory name
-    output_dir = "sliced_image"
+TILE_SIZE = 512  # Tile edge in pixels for the tiled mode; must be even so pyramid levels line up
+TILE_FORMAT = "PNG"  # Any image_converter.SUPPORTED_FORMATS key; JPEG/WEBP tiles are much smaller
+WRITE_WORKERS = os.cpu_count() or 4  # Threads encoding and writing tiles
+# Formats whose pixel data can be stored uncompressed, so a band of rows can be decoded on its own.
+# Everything else (PNG, JPEG, compressed TIFF) is decoded once in full and cut up from memory.
+BAND_FORMATS = ("BMP", "PPM", "TIFF")
+# Pillow's decompression bomb check refuses images over ~179 MP; gigapixel scans are what the tiled
+# mode is for, so the slicer's own opens allow up to this many pixels and other code keeps the default
+MAX_PIXELS = 50000 * 50000
+RAW_BITS = {"1": 1, "L": 8, "P": 8, "LA": 16, "PA": 16, "I;16": 16, "I;16B": 16, "I;16L": 16,
+            "RGB": 24, "BGR": 24, "RGBA": 32, "BGRA": 32, "RGBX": 32, "BGRX": 32, "CMYK": 32}
 
-    # Open the image
-    with Image.open(input_image_path) as img:
+def _open(path):
+    """Image.open with the pixel limit raised to MAX_PIXELS for this call only."""
+    previous = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        return Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = previous
+
+def _band_tiles(tiles, top, bottom):
+    """
+    Decoder tiles for rows top..bottom only, moved up by `top`.
+
+    Returns None unless every tile is raw pixel data with a known row stride.
+    """
+    band = []
+    for codec, (x0, y0, x1, y1), offset, args in tiles:
+        if y1 <= top or y0 >= bottom:
+            continue
+        if codec != "raw":
+            return None
+        rawmode, stride, orientation = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+        if not stride:
+            if rawmode not in RAW_BITS:
+                return None
+            stride = ((x1 - x0) * RAW_BITS[rawmode] + 7) // 8
+        first, last = max(y0, top), min(y1, bottom)
+        # Bottom-up data (BMP) stores the last row first
+        skip = first - y0 if orientation > 0 else y1 - last
+        band.append((codec, (x0, first - top, x1, last - top), offset + skip * stride, (rawmode, stride, orientation)))
+    return band
+
+def iter_bands(input_image_path, row_edges):
+    """
+    Yield (top, band image) for each pair of consecutive row edges.
+
+    Uncompressed BMP/PPM/TIFF files are read one band at a time; other formats are decoded once.
+    """
+    with _open(input_image_path) as img:
+        streamable = img.format in BAND_FORMATS and _band_tiles(img.tile, 0, img.height) is not None
+        if not streamable:
+            img.load()
+            for top, bottom in zip(row_edges, row_edges[1:]):
+                yield top, img.crop((0, top, img.width, bottom))
+            return
+    for top, bottom in zip(row_edges, row_edges[1:]):
+        band = _open(input_image_path)
+        band.tile = _band_tiles(band.tile, top, bottom)
+        band._size = (band.width, bottom - top)
+        band.load()  # Also closes the file
+        yield top, band
+
+def _save_tile(tile, path, tile_format):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    image_converter.save_image(tile, path, tile_format)
+
+class _Writer:
+    """Saves tiles on a thread pool, keeping only a few encodes queued so memory stays flat."""
+
+    def __init__(self, workers, tile_format):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.limit = workers * 4
+        self.tile_format = tile_format
+        self.count = 0
+
+    def save(self, tile, path):
+        while len(self.pending) >= self.limit:
+            self.pending.popleft().result()  # Re-raises a failed write
+        self.pending.append(self.pool.submit(_save_tile, tile, path, self.tile_format))
+        self.count += 1
+
+    def close(self):
+        try:
+            while self.pending:
+                self.pending.popleft().result()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+
+def slice_image_grid(input_image_path, slices_x, slices_y, output_dir="sliced_image", workers=WRITE_WORKERS):
+    with _open(input_image_path) as img:
+        width, height = img.size
+
+    slices_x += 1
+    slices_y += 1
+
+    # Calculate dimensions for each slice; the last row and column take the remainder
+    slice_width = width // slices_x
+    slice_height = height // slices_y
+    col_edges = [j * slice_width for j in range(slices_x)] + [width]
+    row_edges = [i * slice_height for i in range(slices_y)] + [height]
+
+    os.makedirs(output_dir, exist_ok=True)
+    writer = _Writer(workers, "PNG")
+    try:
+        for i, (_, band) in enumerate(iter_bands(input_image_path, row_edges)):
+            for j, (left, right) in enumerate(zip(col_edges, col_edges[1:])):
+                writer.save(band.crop((left, 0, right, band.height)), f"{output_dir}/slice_{i * slices_x + j}.png")
+    finally:
+        writer.close()
+    return writer.count
+
+def slice_image_tiles(input_image_path, tile_size=TILE_SIZE, output_dir="sliced_image", tile_format=TILE_FORMAT,
+                      pyramid=None, workers=WRITE_WORKERS):
+    """
+    Cut an image into tile_size squares (edge tiles are smaller), one row of tiles in memory at a time.
+
+    pyramid: None writes tile_<row>_<col>; "dzi" writes a Deep Zoom image (<name>.dzi and
+    <name>_files/<level>/<col>_<row>, levels down to 1x1 px); "xyz" writes <z>/<x>/<y> with zoom 0
+    being the level that fits in one tile. Every lower level is built in the same pass by halving
+    each finished row of tiles. Returns the number of tiles written.
+    """
+    if tile_size < 2 or tile_size % 2:
+        raise ValueError(f"tile_size must be even, got {tile_size}")
+    if pyramid not in (None, "dzi", "xyz"):
+        raise ValueError(f"Unknown pyramid layout '{pyramid}'. Choose from None, 'dzi', 'xyz'")
+    tile_format = tile_format.upper()
+    extension = image_converter.SUPPORTED_FORMATS[tile_format]
+    with _open(input_image_path) as img:
         width, height = img.size
 
-        slices_x += 1
-        slices_y += 1
+    # How many times the image is halved below full resolution
+    if pyramid == "dzi":
+        depth = math.ceil(math.log2(max(width, height))) if max(width, height) > 1 else 0
+    elif pyramid == "xyz":
+        depth = max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+    else:
+        depth = 0
+
+    name = os.path.splitext(os.path.basename(input_image_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    if pyramid == "dzi":
+        with open(os.path.join(output_dir, f"{name}.dzi"), "w") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{extension}" '
+                    f'Overlap="0" TileSize="{tile_size}">\n'
+                    f'  <Size Width="{width}" Height="{height}"/>\n'
+                    '</Image>\n')
 
-        # Calculate dimensions for each slice
-        slice_width = width // slices_x
-        slice_height = height // slices_y
+    def tile_path(halvings, row, col):
+        if pyramid == "dzi":
+            return os.path.join(output_dir, f"{name}_files", str(depth - halvings), f"{col}_{row}.{extension}")
+        if pyramid == "xyz":
+            return os.path.join(output_dir, str(depth - halvings), str(col), f"{row}.{extension}")
+        return os.path.join(output_dir, f"tile_{row}_{col}.{extension}")
 
-        # Ensure output folder exists
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+    # Per level: rows waiting to fill a row of tiles, and the index of the next tile row
+    buffers = [[] for _ in range(depth + 1)]
+    next_row = [0] * (depth + 1)
+    writer = _Writer(workers, tile_format)
 
-        # Counter for naming slices
-        count = 0
+    def emit_row(halvings, row_img):
+        for col, left in enumerate(range(0, row_img.width, tile_size)):
+            tile = row_img.crop((left, 0, min(left + tile_size, row_img.width), row_img.height))
+            writer.save(tile, tile_path(halvings, next_row[halvings], col))
+        next_row[halvings] += 1
+        if halvings < depth:
+            push(halvings + 1, row_img.reduce(2))
 
-        # Loop through all possible slices in a grid pattern
-        for i in range(slices_y):
-            for j in range(slices_x):
-                # Define the area to crop
-                left = j * slice_width
-                top = i * slice_height
-                right = left + slice_width if j != slices_x - 1 else width
-                bottom = top + slice_height if i != slices_y - 1 else height
+    def take_rows(halvings):
+        """Join the buffered bands of a level into one image."""
+        parts = buffers[halvings]
+        if len(parts) == 1:
+            joined = parts[0]
+        else:
+            joined = Image.new(parts[0].mode, (parts[0].width, sum(part.height for part in parts)))
+            if parts[0].mode == "P":
+                joined.putpalette(parts[0].getpalette())
+            top = 0
+            for part in parts:
+                joined.paste(part, (0, top))
+                top += part.height
+        buffers[halvings] = []
+        return joined
 
-                # Crop the image
-                cropped_img = img.crop((left, top, right, bottom))
+    def push(halvings, band):
+        buffers[halvings].append(band)
+        while sum(part.height for part in buffers[halvings]) >= tile_size:
+            joined = take_rows(halvings)
+            emit_row(halvings, joined.crop((0, 0, joined.width, tile_size)))
+            if joined.height > tile_size:
+                buffers[halvings].append(joined.crop((0, tile_size, joined.width, joined.height)))
 
-                # Save the cropped image
-                cropped_img.save(f"{output_dir}/slice_{count}.png")
-                count += 1
+    try:
+        for _, band in iter_bands(input_image_path, list(range(0, height, tile_size)) + [height]):
+            push(0, band)
+        # Flush the partial last row of every level, top to bottom, so each feeds the next
+        for halvings in range(depth + 1):
+            if buffers[halvings]:
+                emit_row(halvings, take_rows(halvings))
+    finally:
+        writer.close()
+    return writer.count
 
 if __name__ == "__main__":
 
     input_image = "image.png"
     slices_x = 2  # Number of slices horizontally
     slices_y = 2  # Number of slices vertically
+    tile_size = None  # e.g. 512 to cut fixed-size tiles instead of a slices_x by slices_y grid
+    pyramid = None  # With tile_size: "dzi" (Deep Zoom) or "xyz" to also write every zoom level
 
-    slice_image_grid(input_image, slices_x, slices_y)
+    if tile_size:
+        count = slice_image_tiles(input_image, tile_size, pyramid=pyramid)
+    else:
+        count = slice_image_grid(input_image, slices_x, slices_y)
+    print(f"Done. Wrote {count} tiles.")
@@ -0,0 +1,45 @@
+import os
+import json
+import threading
+
+# JSON files under the shared cache folder, read and replaced atomically
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "pctoolbelt")
+
+def read(path):
+    """The dict stored at `path`, or an empty dict if it is missing or unreadable."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def write(path, data):
+    """Write `data` through a temp file and os.replace, so readers never see a half-written file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+def merge(path, sections, max_entries, used=None):
+    """
+    Fold our {section: {key: value}} into what other processes wrote to `path` since we read it, and save.
+
+    Our entries win unless `used` is given and the one on disk has a larger used(value). Sections
+    over `max_entries` lose their smallest used(value) first, or without `used` their oldest keys.
+    OSErrors are printed, not raised: a cache that can't be written only costs time.
+    """
+    merged = read(path)
+    for section, entries in sections.items():
+        target = merged.setdefault(section, {})
+        for key, value in entries.items():
+            if used is None or key not in target or used(target[key]) <= used(value):
+                target[key] = value
+        order = sorted(target, key=lambda key: used(target[key])) if used else list(target)
+        for key in order[:max(0, len(target) - max_entries)]:
+            del target[key]
+    try:
+        write(path, merged)
+    except OSError as e:
+        print(f"Cache write error: {e}")
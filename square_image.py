@@ -1,4 +1,32 @@
 from PIL import Image
+import image_inventory
+
+def square(img):
+    """
+    Crop an in-memory image to a centered square.
+
+    :param img: PIL image.
+    :return: The cropped square image.
+    """
+    width, height = img.size
+    
+    # Determine the size of the square
+    size = min(width, height)
+    
+    # Calculate the left, upper, right, and lower pixels to crop
+    if width > height:  # Crop the sides
+        left = (width - size) // 2
+        top = 0
+        right = left + size
+        bottom = height
+    else:  # Crop the top and bottom
+        left = 0
+        top = (height - size) // 2
+        right = width
+        bottom = top + size
+    
+    # Crop the image
+    return img.crop((left, top, right, bottom))
 
 def make_square(image_path, output_path):
     """
@@ -8,31 +36,17 @@ def make_square(image_path, output_path):
     :param output_path: Path where the squared image will be saved.
     """
     with Image.open(image_path) as img:
-        width, height = img.size
-        
-        # Determine the size of the square
-        size = min(width, height)
-        
-        # Calculate the left, upper, right, and lower pixels to crop
-        if width > height:  # Crop the sides
-            left = (width - size) // 2
-            top = 0
-            right = left + size
-            bottom = height
-        else:  # Crop the top and bottom
-            left = 0
-            top = (height - size) // 2
-            right = width
-            bottom = top + size
-        
-        # Crop the image
-        cropped_img = img.crop((left, top, right, bottom))
-        
         # Save the new square image
-        cropped_img.save(output_path)
+        square(img).save(output_path)
+
+if __name__ == "__main__":
+    # Example usage
+    input_image = "image.png"  # replace with your image path
+    output_image = "image.png"  # replace with desired output path
 
-# Example usage
-input_image = "image.png"  # replace with your image path
-output_image = "image.png"  # replace with desired output path
+    header = image_inventory.read_header(input_image)
+    if header and header["width"] == header["height"] and input_image == output_image:
+        print(f"{input_image} is already square")
+    else:
+        make_square(input_image, output_image)
 
-make_square(input_image, output_image)
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import socket
+import argparse
+import subprocess
+import ffmpeg_cache
+import video_shrink
+import video_converter
+
+# Deterministic synthetic clips: (width, height, seconds). The 60 s clips are long enough for
+# --predict (SAMPLE_COUNT x SAMPLE_SECONDS x 2 s) and for several chunked segments (CHUNK_MIN_SECONDS each)
+CLIPS = [(640, 360, 10), (1280, 720, 10), (1920, 1080, 10), (1280, 720, 30), (640, 360, 60), (1280, 720, 60)]
+CLIP_DIR = "bench_clips"
+OUTPUT_DIR = "bench_out"
+SHRINK_RATIO = 0.25  # Target size as a fraction of the clip size
+SHRINK_ENCODER = "libx264-veryfast"  # Pinned so results do not depend on auto-selection
+SHRINK_MODES = {
+    "bisect": {},
+    "predict": {"predict": True},
+    "chunked": {"chunked": True},
+}
+CONVERT_FORMATS = ["mkv", "webm"]
+
+def make_clip(width, height, seconds, clip_dir=CLIP_DIR):
+    """Render a testsrc2 + sine clip once; the same settings always give the same file."""
+    os.makedirs(clip_dir, exist_ok=True)
+    path = os.path.join(clip_dir, f"testsrc2_{width}x{height}_{seconds}s.mp4")
+    if os.path.exists(path):
+        return path
+    print(f"Generating {path}")
+    cmd = [
+        "ffmpeg", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "16", "-g", "60", "-threads", "1",
+        "-c:a", "aac", "-b:a", "192k",
+        "-fflags", "+bitexact", "-flags:v", "+bitexact", "-flags:a", "+bitexact", "-map_metadata", "-1",
+        "-loglevel", "error", path
+    ]
+    subprocess.run(cmd, check=True)
+    return path
+
+def timed(func):
+    started = time.time()
+    result = func()
+    return result, time.time() - started
+
+def bench_shrink(clip, duration, mode, options, output_dir=OUTPUT_DIR):
+    name = os.path.splitext(os.path.basename(clip))[0]
+    output_path = os.path.join(output_dir, f"{name}_{mode}.mp4")
+    size_mb = video_shrink.get_file_size_mb(clip) * SHRINK_RATIO
+    stats = {}
+    output, elapsed = timed(lambda: video_shrink.resize_video(
+        clip, size_mb, output_path=output_path, encoder=SHRINK_ENCODER, stats=stats, **options
+    ))
+    return {
+        "tool": "video_shrink",
+        "mode": mode,
+        "target_mb": round(size_mb, 3),
+        "ok": bool(output),
+        "seconds": round(elapsed, 3),
+        "speed": round(duration / elapsed, 3) if elapsed else None,
+        "output_mb": round(video_shrink.get_file_size_mb(output), 3) if output else 0,
+        "iterations": stats.get("passes", 0),
+        # Passes stopped part-way by the early abort still cost encoding time
+        "early_aborts": stats.get("early_aborts", 0),
+        "abort_saved_seconds": stats.get("abort_saved_seconds", 0),
+        "encodes": stats.get("passes", 0) + stats.get("early_aborts", 0),
+        # Whether the mode actually took effect: a short clip falls back to bisection / one segment
+        "predicted": stats.get("predicted", False),
+        "segments": stats.get("segments", 1),
+    }
+
+def bench_convert(clip, duration, output_format, output_dir=OUTPUT_DIR):
+    name = os.path.splitext(os.path.basename(clip))[0]
+    output_path = os.path.join(output_dir, f"{name}.{output_format}")
+    # remux=False: an mkv target could otherwise just copy the streams and measure nothing
+    ok, elapsed = timed(lambda: video_converter.convert_video(clip, output_format, output_path, remux=False))
+    return {
+        "tool": "video_converter",
+        "mode": output_format,
+        "ok": bool(ok),
+        "seconds": round(elapsed, 3),
+        "speed": round(duration / elapsed, 3) if elapsed else None,
+        "output_mb": round(video_shrink.get_file_size_mb(output_path), 3) if ok else 0,
+        "iterations": 1,
+        "early_aborts": 0,
+        "abort_saved_seconds": 0,
+        "encodes": 1,
+    }
+
+def run_suite(clips=CLIPS, modes=None, formats=None, repeat=1):
+    modes = modes or list(SHRINK_MODES)
+    formats = formats if formats is not None else CONVERT_FORMATS
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    results = []
+    for width, height, seconds in clips:
+        clip = make_clip(width, height, seconds)
+        for run in range(repeat):
+            cases = [lambda m=m: bench_shrink(clip, seconds, m, SHRINK_MODES[m]) for m in modes]
+            cases += [lambda f=f: bench_convert(clip, seconds, f) for f in formats]
+            for case in cases:
+                entry = case()
+                entry.update(clip=os.path.basename(clip), resolution=f"{width}x{height}", duration=seconds, run=run)
+                results.append(entry)
+                print(f"{entry['clip']} {entry['tool']}:{entry['mode']} {entry['seconds']:.2f}s "
+                      f"({entry['speed']}x) -> {entry['output_mb']} MB in {entry['iterations']} pass(es)"
+                      + (f" + {entry['early_aborts']} aborted (~{entry['abort_saved_seconds']}s saved)"
+                         if entry["early_aborts"] else "")
+                      + (f", predicted: {entry['predicted']}" if entry["mode"] == "predict" else "")
+                      + (f", {entry['segments']} segments" if entry["mode"] == "chunked" else ""))
+    return results
+
+def compare(results, baseline):
+    """Print wall-time and size deltas against a baseline report, case by case."""
+    def key(entry):
+        return entry["clip"], entry["tool"], entry["mode"], entry.get("run", 0)
+    previous = {key(entry): entry for entry in baseline.get("results", [])}
+    print("\nAgainst baseline:")
+    for entry in results:
+        old = previous.get(key(entry))
+        if not old or not old["seconds"]:
+            continue
+        time_delta = (entry["seconds"] - old["seconds"]) / old["seconds"] * 100
+        size_delta = (entry["output_mb"] - old["output_mb"]) / old["output_mb"] * 100 if old["output_mb"] else 0
+        print(f"  {entry['clip']} {entry['tool']}:{entry['mode']}: time {time_delta:+.1f}%, size {size_delta:+.1f}%, "
+              f"passes {old['iterations']} -> {entry['iterations']}, "
+              f"encodes {old.get('encodes', old['iterations'])} -> {entry['encodes']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark video_shrink and video_converter on synthetic clips.")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--modes", nargs="*", choices=list(SHRINK_MODES), help="video_shrink modes to run")
+    parser.add_argument("--formats", nargs="*", help="video_converter output formats to run")
+    parser.add_argument("--quick", action="store_true", help="Only the smallest clip")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    clips = CLIPS[:1] if args.quick else CLIPS
+    results = run_suite(clips, args.modes, args.formats, args.repeat)
+    report = {
+        "host": socket.gethostname(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_cache.ffmpeg_key(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
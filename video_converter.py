@@ -1,9 +1,16 @@
 import ffmpeg
 import os
-import argparse
-import subprocess
 import re
+import math
+import json
+import time
+import asyncio
+import argparse
 from tqdm import tqdm
+import ffmpeg_cache
+import ffmpeg_progress
+import video_segments
+import video_inputs
 
 # Supported video formats and their extensions
 SUPPORTED_FORMATS = {
@@ -17,6 +24,76 @@ SUPPORTED_FORMATS = {
     "MPEG": "mpeg"
 }
 
+# Codecs (ffprobe codec_name) each container accepts as-is; anything else is transcoded
+CONTAINER_CODECS = {
+    "mp4": {
+        "video": {"h264", "hevc", "av1", "vp9", "mpeg4", "mpeg2video"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "opus", "flac", "alac"},
+    },
+    "mov": {
+        "video": {"h264", "hevc", "mpeg4", "prores", "mjpeg", "mpeg2video"},
+        "audio": {"aac", "mp3", "ac3", "alac", "pcm_s16le", "pcm_s24le"},
+    },
+    "mkv": {
+        "video": {"h264", "hevc", "av1", "vp8", "vp9", "mpeg4", "mpeg2video", "prores", "mjpeg", "theora"},
+        "audio": {"aac", "mp3", "ac3", "eac3", "dts", "opus", "vorbis", "flac", "alac", "pcm_s16le", "pcm_s24le"},
+    },
+    "webm": {"video": {"vp8", "vp9", "av1"}, "audio": {"opus", "vorbis"}},
+    "avi": {"video": {"h264", "mpeg4", "mjpeg"}, "audio": {"mp3", "ac3", "pcm_s16le"}},
+    "flv": {"video": {"h264", "flv1"}, "audio": {"aac", "mp3"}},
+    "wmv": {"video": {"wmv1", "wmv2", "wmv3", "vc1", "mpeg4"}, "audio": {"wmav1", "wmav2", "mp3"}},
+    "mpeg": {"video": {"mpeg1video", "mpeg2video"}, "audio": {"mp2", "mp3", "ac3"}},
+}
+# ffprobe format_name each container shows up as; mp4 and mov are told apart by their major brand
+CONTAINER_NAMES = {"mp4": "mov", "mov": "mov", "mkv": "matroska", "webm": "webm", "avi": "avi", "flv": "flv",
+                   "wmv": "asf", "mpeg": "mpeg"}
+# Encoders used when a stream has to be transcoded: (video, audio)
+TRANSCODE_CODECS = {
+    "mp4": ("libx264", "aac"),
+    "mov": ("libx264", "aac"),
+    "mkv": ("libx264", "aac"),
+    "avi": ("libx264", "mp3"),
+    "webm": ("libvpx-vp9", "libopus"),
+    "flv": ("libx264", "aac"),
+    "wmv": ("mpeg4", "mp3"),
+    "mpeg": ("mpeg2video", "mp2"),
+}
+
+BATCH_JOBS = max(2, (os.cpu_count() or 1) // 2)  # Remuxes are I/O bound; x264 threads itself
+BATCH_RETRIES = 1  # Extra attempts per file after a failure
+RETRY_DELAY = 2  # Seconds before a retry, multiplied by the attempt number
+NOT_CONVERTIBLE = "Cannot convert this input"  # Deterministic, so never retried
+RESUME_SEGMENT_SECONDS = 300  # Most work a resumable conversion can lose to an interruption
+
+def parse_target(spec):
+    """
+    Parse an output spec "format[:<height>p][:<bitrate>]", e.g. "webm", "mp4:480p" or "mp4:480p:800k".
+
+    Returns {"format", "height", "bitrate"} with bitrate as an ffmpeg value such as "800k";
+    raises ValueError for a malformed spec.
+    """
+    parts = spec.lower().split(":")
+    target = {"format": parts[0], "height": None, "bitrate": None}
+    if target["format"] not in SUPPORTED_FORMATS.values():
+        raise ValueError(f"Invalid output format '{parts[0]}'. Supported: {', '.join(SUPPORTED_FORMATS.values())}")
+    for part in parts[1:]:
+        if re.fullmatch(r"\d+p", part):
+            target["height"] = int(part[:-1])
+        elif re.fullmatch(r"\d+(\.\d+)?[km]", part):
+            target["bitrate"] = part
+        else:
+            raise ValueError(f"Invalid target option '{part}' in '{spec}' (expected e.g. 480p or 800k)")
+    return target
+
+def target_path(target, output_base="output_video"):
+    """Output name for a target; scale and bitrate are added so targets with the same format don't collide."""
+    name = output_base
+    if target["height"]:
+        name += f"_{target['height']}p"
+    if target["bitrate"]:
+        name += f"_{target['bitrate']}"
+    return f"{name}.{target['format']}"
+
 def get_video_file():
     """Find the first video file in the current directory."""
     for ext in SUPPORTED_FORMATS.values():
@@ -28,7 +105,7 @@ def get_video_file():
 def get_input_format(input_path):
     """Identify the input video format using ffmpeg.probe."""
     try:
-        probe = ffmpeg.probe(input_path)
+        probe = ffmpeg_cache.probe(input_path)
         input_format = probe['format']['format_name'].split(',')[0].upper()
         # Map common format names to supported ones
         format_map = {
@@ -41,70 +118,197 @@ def get_input_format(input_path):
         print(f"Error probing input format: {e.stderr.decode()}")
         return None
 
-def convert_video(input_path, output_format):
-    """Convert video to the specified output format."""
+def select_codecs(output_format):
+    """Video and audio encoders for streams the output container cannot take as-is."""
+    return TRANSCODE_CODECS[output_format]
+
+def plan_streams(probe, output_format, remux=True):
+    """
+    Decide per stream whether to copy or transcode, from existing probe data.
+
+    Returns (stream index, codec_type, codec_name, encoder) for the first video and first
+    audio stream; encoder is "copy" when the container accepts the codec.
+    Cover art attached as a video stream is skipped.
+    """
+    accepted = CONTAINER_CODECS[output_format]
+    encoders = dict(zip(("video", "audio"), select_codecs(output_format)))
+    plan = []
+    for kind in ("video", "audio"):
+        for stream in probe["streams"]:
+            if stream.get("codec_type") != kind or stream.get("disposition", {}).get("attached_pic"):
+                continue
+            codec = stream.get("codec_name")
+            encoder = "copy" if remux and codec in accepted[kind] else encoders[kind]
+            plan.append((stream["index"], kind, codec, encoder))
+            break
+    return plan
+
+def is_converted(input_path, output_format):
+    """Whether `input_path` already is an `output_format` file whose streams that container accepts as-is."""
+    try:
+        probe = ffmpeg_cache.probe(input_path)
+    except ffmpeg.Error:
+        return False
+    if CONTAINER_NAMES[output_format] not in probe["format"]["format_name"].split(","):
+        return False
+    if output_format in ("mp4", "mov"):
+        brand = probe["format"].get("tags", {}).get("major_brand", "").strip()
+        if (brand == "qt") != (output_format == "mov"):
+            return False
+    plan = plan_streams(probe, output_format)
+    return bool(plan) and all(encoder == "copy" for *_, encoder in plan)
+
+def prepare_conversion(input_path, output_format, output_path=None, remux=True, quiet=False):
+    """
+    Validate the input and build the ffmpeg command.
+
+    Returns (cmd, duration, output_path, plan), or None after printing why the input cannot be converted.
+    Streams the target container already accepts are copied; only the rest are transcoded.
+    """
     if not os.path.exists(input_path):
         print(f"File not found: {input_path}")
-        return False
+        return None
 
     # Validate output format
     output_format = output_format.lower()
     if output_format not in SUPPORTED_FORMATS.values():
         print(f"Invalid output format '{output_format}'. Supported: {', '.join(SUPPORTED_FORMATS.values())}")
-        return False
+        return None
 
     # Get input format
     input_format = get_input_format(input_path)
     if not input_format or input_format not in SUPPORTED_FORMATS:
         print(f"Unsupported input format '{input_format}'. Supported: {list(SUPPORTED_FORMATS.keys())}")
-        return False
+        return None
 
     # Define output path
-    base, _ = os.path.splitext(input_path)
-    output_path = f"output_video.{output_format}"
+    if not output_path:
+        output_path = f"output_video.{output_format}"
+
+    # Copy what the container accepts, transcode the rest
+    probe = ffmpeg_cache.probe(input_path)
+    duration = float(probe['format']['duration'])
+    plan = plan_streams(probe, output_format, remux)
+    if not plan:
+        print(f"No video or audio streams in {input_path}")
+        return None
+
+    cmd = ["ffmpeg", "-y", "-i", input_path]
+    for index, kind, codec, encoder in plan:
+        cmd.extend(["-map", f"0:{index}"])
+        flag = "v" if kind == "video" else "a"
+        cmd.extend([f"-c:{flag}", encoder])
+        if not quiet:
+            print(f"{kind.capitalize()}: {codec} -> {'copy' if encoder == 'copy' else encoder}")
+        if encoder == "libx264":
+            cmd.extend(["-preset", "fast"])  # Balance speed and quality
+        if encoder == "copy" and codec == "hevc" and output_format in ("mp4", "mov"):
+            cmd.extend(["-tag:v", "hvc1"])  # Players such as QuickTime only accept the hvc1 tag
+    cmd.extend(["-loglevel", "info", output_path])
+    if all(encoder == "copy" for *_, encoder in plan) and not quiet:
+        print("Remuxing without re-encoding")
+    return cmd, duration, output_path, plan
+
+def check_result(result):
+    """Return an error message for a failed FFmpegResult, or None when it succeeded."""
+    if result.stalled:
+        return f"FFmpeg made no progress for {ffmpeg_progress.STALL_SECONDS}s and was stopped"
+    if result.returncode != 0:
+        return f"FFmpeg exited with code {result.returncode}\n{result.stderr[-2000:]}"
+    return None
+
+def convert_resumable(input_path, output_format, output_path, plan, duration):
+    """
+    Transcode in keyframe-aligned segments journaled in <output>.parts, then concatenate.
+
+    Rerunning after an interruption (Ctrl-C, OOM kill, reboot) skips the finished segments.
+    """
+    work_dir = video_segments.parts_dir(output_path)
+    journal = video_segments.load_journal(work_dir, input_path)
+    if not journal["segments"]:
+        count = math.ceil(duration / RESUME_SEGMENT_SECONDS)
+        journal["segments"] = video_segments.plan_segments(input_path, duration, count)
+        video_segments.save_journal(work_dir, journal)
+    segments = journal["segments"]
+    video = next(entry for entry in plan if entry[1] == "video")
+    audio = next((entry for entry in plan if entry[1] == "audio"), None)
+    print(f"Resumable: {len(segments)} segments, journal in {work_dir}")
+
+    segment_paths = []
+    with tqdm(total=duration, desc="Converting (resumable)", unit="s", dynamic_ncols=True) as pbar:
+        for i, segment in enumerate(segments):
+            name = f"segment_{i:04d}.{output_format}"
+            path = os.path.join(work_dir, name)
+            segment_paths.append(path)
+            length = segment["end"] - segment["start"]
+            params = {"start": segment["start"], "end": segment["end"], "encoder": video[3]}
+            offset = pbar.n
+            if not video_segments.is_done(work_dir, journal, name, params):
+                cmd = ["ffmpeg", "-y", "-ss", str(segment["start"]), "-i", input_path, "-t", str(length),
+                       "-map", f"0:{video[0]}", "-c:v", video[3]]
+                if video[3] == "libx264":
+                    cmd.extend(["-preset", "fast"])
+                cmd.extend(["-an", "-loglevel", "info", path])
+
+                def update(event):
+                    if event.out_time is not None:
+                        pbar.n = offset + min(event.out_time, length)
+                        pbar.refresh()
+
+                error = check_result(ffmpeg_progress.run_ffmpeg(cmd, update))
+                if error:
+                    print(f"Error in segment {i} at {segment['start']:.1f}s: {error}")
+                    return False
+                video_segments.mark_done(work_dir, journal, name, params)
+            pbar.n = offset + length
+            pbar.refresh()
+
+    audio_path = None
+    if audio:
+        index, _, codec, encoder = audio
+        name = f"audio.{output_format}"
+        audio_path = os.path.join(work_dir, name)
+        if not video_segments.is_done(work_dir, journal, name, {"encoder": encoder}):
+            cmd = ["ffmpeg", "-y", "-i", input_path, "-map", f"0:{index}", "-vn", "-c:a", encoder,
+                   "-loglevel", "error", audio_path]
+            error = check_result(ffmpeg_progress.run_ffmpeg(cmd))
+            if error:
+                print(f"Error in audio: {error}")
+                return False
+            video_segments.mark_done(work_dir, journal, name, {"encoder": encoder})
+
+    if not video_segments.concat(work_dir, segment_paths, output_path, audio_path):
+        return False
+    video_segments.discard(work_dir)
+    return True
 
+def convert_video(input_path, output_format, output_path=None, remux=True, resume=False):
+    """
+    Convert video to the specified output format (default output: output_video.<format>).
+
+    Streams the target container already accepts are copied; only the rest are transcoded.
+    With remux=False everything is transcoded. With resume=True a video transcode runs in
+    journaled segments (see convert_resumable); pure remuxes are quick and run as usual.
+    """
     try:
-        # Select appropriate codecs
-        codec_v = "libx264" if output_format in ["mp4", "mov", "mkv", "avi"] else "vp9" if output_format == "webm" else "mpeg4"
-        codec_a = "aac" if output_format in ["mp4", "mov", "mkv", "webm"] else "mp3"
-
-        # Run FFmpeg conversion with progress
-        cmd = [
-            "ffmpeg", "-y", "-i", input_path,
-            "-c:v", codec_v, "-c:a", codec_a,
-            "-preset", "fast",  # Balance speed and quality
-            "-progress", "pipe:2", "-loglevel", "info",
-            output_path
-        ]
+        prepared = prepare_conversion(input_path, output_format, output_path, remux)
+        if not prepared:
+            return False
+        cmd, duration, output_path, plan = prepared
 
-        # Get video duration for progress bar
-        probe = ffmpeg.probe(input_path)
-        duration = float(probe['format']['duration'])
-
-        # Start FFmpeg subprocess
-        process = subprocess.Popen(
-            cmd,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            encoding='utf-8'
-        )
-
-        # Progress bar
-        from tqdm import tqdm
-        time_regex = re.compile(r"out_time_ms=(\d+)")
+        if resume and any(kind == "video" and encoder != "copy" for _, kind, _, encoder in plan):
+            if not convert_resumable(input_path, output_format.lower(), output_path, plan, duration):
+                return False
+            print(f"Conversion successful! Saved as {output_path}")
+            return True
+
+        # Run FFmpeg with a progress bar; a conversion that stops advancing is killed
         with tqdm(total=duration, desc="Converting", unit="s", dynamic_ncols=True) as pbar:
-            while True:
-                line = process.stderr.readline()
-                if not line and process.poll() is not None:
-                    break
-                match = time_regex.search(line)
-                if match:
-                    current_time = int(match.group(1)) / 1_000_000
-                    pbar.n = min(current_time, duration)
-                    pbar.refresh()
-
-        if process.returncode != 0:
-            print(f"Error: FFmpeg exited with code {process.returncode}")
+            result = ffmpeg_progress.run_ffmpeg(cmd, ffmpeg_progress.tqdm_progress(pbar, duration))
+
+        error = check_result(result)
+        if error:
+            print(f"Error: {error}")
             return False
 
         print(f"Conversion successful! Saved as {output_path}")
@@ -117,17 +321,306 @@ def convert_video(input_path, output_format):
         print(f"Error during conversion: {e}")
         return False
 
+async def convert_video_async(input_path, output_format, output_path=None, remux=True, on_progress=None, quiet=True):
+    """
+    convert_video for an event loop: probing runs in a thread, ffmpeg as an asyncio subprocess.
+
+    Returns an error message, or None on success. Cancelling the task kills ffmpeg.
+    """
+    try:
+        prepared = await asyncio.to_thread(prepare_conversion, input_path, output_format, output_path, remux,
+                                           quiet)
+    except ffmpeg.Error as e:
+        return f"FFmpeg error: {e.stderr.decode()}"
+    if not prepared:
+        return NOT_CONVERTIBLE
+    cmd, duration, output_path, plan = prepared
+    return check_result(await ffmpeg_progress.run_ffmpeg_async(cmd, on_progress))
+
+def convert_multi(input_path, targets, output_base="output_video", remux=True):
+    """
+    Produce several outputs from one ffmpeg run, so the source is decoded only once.
+
+    `targets` are parse_target specs. The decoded video is split once per output that needs
+    encoding and scaled per target; outputs without scale or bitrate still stream-copy what
+    their container accepts. Each output gets its own progress bar with its size so far.
+    Targets that name the same file are written once; a target that would overwrite the input
+    is an error. Returns the list of output paths, or None on failure.
+    """
+    try:
+        probe = ffmpeg_cache.probe(input_path)
+    except ffmpeg.Error as e:
+        print(f"FFmpeg error: {e.stderr.decode()}")
+        return None
+    duration = float(probe['format']['duration'])
+    source = next((stream for stream in probe["streams"] if stream.get("codec_type") == "video"), None)
+
+    outputs, encoded = [], []
+    for target in targets:
+        output_path = target_path(target, output_base)
+        # ffmpeg would write the same file twice in one run
+        if any(os.path.abspath(path) == os.path.abspath(output_path) for _, _, path in outputs):
+            print(f"Note: {output_path} is requested more than once, writing it once")
+            continue
+        if os.path.abspath(output_path) == os.path.abspath(input_path):
+            print(f"Error: {output_path} is the input; choose another output name")
+            return None
+        output_format = target["format"]
+        plan = plan_streams(probe, output_format, remux)
+        if not plan:
+            print(f"No video or audio streams in {input_path}")
+            return None
+        video_encoder = select_codecs(output_format)[0]
+        plan = [
+            (index, kind, codec, video_encoder if kind == "video" and (target["height"] or target["bitrate"]) else encoder)
+            for index, kind, codec, encoder in plan
+        ]
+        outputs.append((target, plan, output_path))
+        encoded.extend(index for index, kind, _, encoder in plan if kind == "video" and encoder != "copy")
+
+    # Decode the video once and fan it out to every output that re-encodes it
+    filters = []
+    if encoded:
+        labels = [f"[v{i}]" for i in range(len(encoded))]
+        filters.append(f"[0:{encoded[0]}]split={len(labels)}{''.join(labels)}")
+    cmd = []
+    branch = 0
+    for target, plan, output_path in outputs:
+        for index, kind, codec, encoder in plan:
+            flag = "v" if kind == "video" else "a"
+            if kind == "video" and encoder != "copy":
+                label = f"[v{branch}]"
+                height = target["height"]
+                if height and source and height < int(source.get("height", 0)):
+                    filters.append(f"{label}scale=-2:{height}[s{branch}]")
+                    label = f"[s{branch}]"
+                cmd.extend(["-map", label])
+                branch += 1
+            else:
+                cmd.extend(["-map", f"0:{index}"])
+            cmd.extend([f"-c:{flag}", encoder])
+            if kind == "video" and target["bitrate"] and encoder != "copy":
+                cmd.extend(["-b:v", target["bitrate"]])
+            if encoder == "libx264":
+                cmd.extend(["-preset", "fast"])
+            if encoder == "copy" and codec == "hevc" and target["format"] in ("mp4", "mov"):
+                cmd.extend(["-tag:v", "hvc1"])
+            print(f"{output_path}: {kind} {codec} -> {'copy' if encoder == 'copy' else encoder}")
+        cmd.append(output_path)
+    head = ["ffmpeg", "-y", "-loglevel", "info", "-i", input_path]
+    if filters:
+        head.extend(["-filter_complex", ";".join(filters)])
+    cmd = head + cmd
+
+    # ffmpeg reports one shared position; each bar adds its own output's size
+    bars = [
+        tqdm(total=duration, desc=os.path.basename(path), unit="s", position=i, dynamic_ncols=True)
+        for i, (_, _, path) in enumerate(outputs)
+    ]
+
+    def update(event):
+        for bar, (_, _, path) in zip(bars, outputs):
+            if event.out_time is not None:
+                bar.n = min(event.out_time, duration)
+            if os.path.exists(path):
+                bar.set_postfix({"MB": f"{os.path.getsize(path) / 1_000_000:.2f}"}, refresh=False)
+            bar.refresh()
+
+    try:
+        result = ffmpeg_progress.run_ffmpeg(cmd, update)
+    finally:
+        for bar in bars:
+            bar.close()
+    error = check_result(result)
+    if error:
+        print(f"Error: {error}")
+        return None
+    paths = [path for _, _, path in outputs]
+    for path in paths:
+        print(f"Saved {path} ({os.path.getsize(path) / 1_000_000:.2f} MB)")
+    return paths
+
+async def convert_batch_async(paths, output_format, output_dir=None, jobs=None, retries=BATCH_RETRIES, remux=True):
+    """
+    Convert many files with at most `jobs` ffmpeg processes at once.
+
+    Progress is aggregated over the total duration. Files failing in ffmpeg or on an OS error are
+    retried `retries` times. Inputs that would share an output name get distinct ones up front.
+    An input that already is a file of the target format (by probe, not just its extension) is
+    skipped; one that only has the extension is converted to a name of its own. Outputs are written as <name>.part.<ext> and renamed when complete, so a file whose output
+    already exists and is newer than the input is skipped; this makes reruns resume.
+    Cancelling (Ctrl-C) kills the running ffmpeg processes and marks unfinished files cancelled.
+    Returns one status entry per input, in input order.
+    """
+    output_format = output_format.lower()
+    jobs = max(1, jobs or BATCH_JOBS)
+    outputs = await asyncio.to_thread(video_inputs.batch_outputs, paths, output_dir, "", f".{output_format}",
+                                      lambda path: is_converted(path, output_format))
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def duration_of(path):
+        try:
+            probe = await asyncio.to_thread(ffmpeg_cache.probe, path)
+            return float(probe['format']['duration'])
+        except Exception:
+            return 0.0
+
+    durations = dict(zip(paths, await asyncio.gather(*(duration_of(path) for path in paths))))
+    # Longest first, so one long file does not start last and run alone
+    ordered = sorted(paths, key=lambda p: durations[p], reverse=True)
+    positions = dict.fromkeys(paths, 0.0)
+    entries = {path: {"input": path, "status": "pending", "attempts": 0} for path in paths}
+    print(f"Batch: {len(paths)} files, {jobs} concurrent jobs")
+    pbar = tqdm(total=sum(durations.values()), desc="Converting", unit="s", dynamic_ncols=True)
+
+    def tracker(path):
+        def update(event):
+            if event.out_time is not None:
+                positions[path] = min(event.out_time, durations[path])
+                pbar.n = sum(positions.values())
+                pbar.refresh()
+        return update
+
+    async def run(path):
+        entry = entries[path]
+        output_path = outputs[path]
+        entry["output"] = output_path
+        if output_path == path:
+            entry["status"] = "skipped"  # Already a file of the target format (see is_converted)
+        elif os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(path):
+            entry["status"] = "skipped"  # Converted by an earlier run
+        if entry["status"] == "skipped":
+            positions[path] = durations[path]
+            return entry
+        root, ext = os.path.splitext(output_path)
+        part_path = f"{root}.part{ext}"
+        started = time.time()
+        try:
+            async with semaphore:
+                for attempt in range(retries + 1):
+                    if attempt:
+                        await asyncio.sleep(RETRY_DELAY * attempt)
+                    entry["attempts"] = attempt + 1
+                    positions[path] = 0.0
+                    try:
+                        error = await convert_video_async(path, output_format, part_path, remux, tracker(path))
+                        if not error:
+                            os.replace(part_path, output_path)
+                    except OSError as e:
+                        error = f"OS error: {e}"
+                    if not error:
+                        entry.pop("error", None)
+                        entry["status"] = "ok"
+                        break
+                    entry.update(status="failed", error=error.strip().splitlines()[-1] if error.strip() else error)
+                    pbar.write(f"Attempt {attempt + 1} failed for {os.path.basename(path)}: {entry['error']}")
+                    if error == NOT_CONVERTIBLE:
+                        break  # Only ffmpeg and OS failures can go away on a retry
+        except asyncio.CancelledError:
+            entry["status"] = "cancelled"
+            raise
+        finally:
+            entry["seconds"] = round(time.time() - started, 2)
+            positions[path] = durations[path]
+            if entry["status"] != "ok" and os.path.exists(part_path):
+                os.remove(part_path)
+        return entry
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    started = time.time()
+    tasks = [asyncio.create_task(run(path)) for path in ordered]
+    finished = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            entry = await next_done
+            finished += 1
+            pbar.write(f"[{finished}/{len(tasks)}] {entry['status']}: {entry['input']}")
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        pbar.write("Cancelled")
+    finally:
+        pbar.close()
+    elapsed = time.time() - started
+
+    results = [entries[path] for path in paths]
+    for entry in results:
+        if entry["status"] == "pending":
+            entry["status"] = "cancelled"
+    print(f"Batch finished in {elapsed:.1f}s: " + ", ".join(
+        f"{sum(1 for e in results if e['status'] == status)} {status}"
+        for status in ("ok", "skipped", "failed", "cancelled")
+    ))
+    return results
+
+def convert_batch(patterns, output_format, output_dir=None, jobs=None, retries=BATCH_RETRIES, remux=True,
+                  report_path=None):
+    """Blocking entry point for convert_batch_async that also writes an optional JSON report."""
+    if output_format.lower() not in SUPPORTED_FORMATS.values():
+        print(f"Invalid output format '{output_format}'. Supported: {', '.join(SUPPORTED_FORMATS.values())}")
+        return []
+    paths = video_inputs.collect_inputs(patterns, [f".{ext}" for ext in SUPPORTED_FORMATS.values()], (".part",))
+    if not paths:
+        print("Error: No input videos found")
+        return []
+    started = time.time()
+    entries = asyncio.run(convert_batch_async(paths, output_format, output_dir, jobs, retries, remux))
+    for entry in entries:
+        if entry["status"] == "failed":
+            print(f"  failed: {entry['input']}: {entry.get('error')}")
+    if report_path:
+        report = {
+            "format": output_format,
+            "jobs": jobs or BATCH_JOBS,
+            "elapsed_seconds": round(time.time() - started, 2),
+            "files": entries,
+        }
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {report_path}")
+    return entries
+
 if __name__ == "__main__":
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Convert a video to a specified format.")
+    parser.add_argument("inputs", nargs="*", help="Videos, directories or globs to convert as a batch")
     parser.add_argument("--format", default="mp4", help="Output format (e.g., mp4, mov)")
+    parser.add_argument("--targets", nargs="+", metavar="SPEC",
+                        help="Several outputs from one decode, e.g. mp4 webm mp4:480p:800k")
+    parser.add_argument("--no-remux", dest="remux", action="store_false",
+                        help="Transcode every stream, even ones the target container accepts")
+    parser.add_argument("--resume", action="store_true",
+                        help="Transcode in journaled segments so an interrupted conversion continues where it stopped")
+    parser.add_argument("--jobs", type=int, help=f"Concurrent conversions in batch mode (default: {BATCH_JOBS})")
+    parser.add_argument("--retries", type=int, default=BATCH_RETRIES, help="Extra attempts for a failed file")
+    parser.add_argument("--output-dir", help="Where batch outputs go (default: next to each input)")
+    parser.add_argument("--report", help="Write a JSON report of the batch to this path")
     args = parser.parse_args()
 
+    if args.targets:
+        try:
+            targets = [parse_target(spec) for spec in args.targets]
+        except ValueError as e:
+            parser.error(str(e))
+        if len(args.inputs) > 1:
+            parser.error("--targets converts one input at a time")
+        input_file = args.inputs[0] if args.inputs else get_video_file()
+        if not input_file:
+            parser.error("No input_video.<type> found")
+        raise SystemExit(0 if convert_multi(input_file, targets, remux=args.remux) else 1)
+
+    if args.inputs:
+        entries = convert_batch(args.inputs, args.format, args.output_dir, args.jobs, args.retries, args.remux,
+                                args.report)
+        raise SystemExit(0 if entries and all(e["status"] in ("ok", "skipped") for e in entries) else 1)
+
     # Find input video
     input_file = get_video_file()
     if input_file:
         print(f"Found input file: {input_file}")
-        if convert_video(input_file, args.format):
+        if convert_video(input_file, args.format, remux=args.remux, resume=args.resume):
             print("Conversion complete.")
         else:
             print("Conversion failed.")
@@ -0,0 +1,64 @@
+import os
+import glob
+
+# Finding the inputs of a batch run and naming its outputs, shared by video_shrink and video_converter
+
+def collect_inputs(patterns, extensions, skip_suffixes=()):
+    """
+    Expand files, directories and globs into a sorted list of video paths.
+
+    Files whose name (before the extension) ends with one of `skip_suffixes` are our own outputs
+    or temp files from earlier runs and are left out, as is everything inside <output>.parts.
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+        for path in candidates:
+            if skip_suffixes and os.path.splitext(os.path.basename(path))[0].endswith(tuple(skip_suffixes)):
+                continue
+            if os.path.basename(os.path.dirname(path)).endswith(".parts"):
+                continue
+            if os.path.isfile(path) and path.lower().endswith(extensions):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+def batch_outputs(paths, output_dir=None, suffix="", extension="", is_done=None):
+    """
+    Output path <name><suffix><extension> for each input, as {input: path}.
+
+    An input that already is its own output (a.mp4 when converting to mp4) keeps its path, unless
+    is_done(path) says its content still needs work; it then gets a name of its own. Inputs that
+    keep their path don't claim it, so the output of an earlier run (a.mp4 for a.mkv) is found
+    again and the caller's mtime check decides whether to redo it. Inputs that would write the
+    same path, e.g. a.mov and a.mkv, or same-named files from different folders with output_dir,
+    get their own extension and then a counter added to the name instead of overwriting each other.
+    """
+    outputs = {}
+    pending = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        output_path = os.path.join(os.path.abspath(output_dir or os.path.dirname(path)), name + suffix + extension)
+        if output_path == os.path.abspath(path) and (is_done is None or is_done(path)):
+            outputs[path] = output_path
+        else:
+            pending.append(path)
+    # An input that is going to be read is never written to
+    taken = set(os.path.abspath(path) for path in pending)
+    for path in pending:
+        name, ext = os.path.splitext(os.path.basename(path))
+        folder = os.path.abspath(output_dir or os.path.dirname(path))
+        ext = ext.lstrip(".")
+        candidates = [name, f"{name}_{ext}"] + [f"{name}_{ext}_{n}" for n in range(2, len(paths) + 2)]
+        for candidate in candidates:
+            output_path = os.path.join(folder, candidate + suffix + extension)
+            if output_path not in taken:
+                break
+        if candidate != name:
+            print(f"Note: writing {os.path.basename(output_path)} for {path} so it doesn't overwrite another file")
+        taken.add(output_path)
+        outputs[path] = output_path
+    return outputs
@@ -0,0 +1,132 @@
+import os
+import json
+import shutil
+import subprocess
+import threading
+import ffmpeg_cache
+
+# Keyframe-aligned segments and the journal that lets an interrupted encode resume
+CHUNK_MIN_SECONDS = 10
+JOURNAL_NAME = "journal.json"
+
+_lock = threading.Lock()
+
+def probe_gops(input_path):
+    """
+    Return [start_time, bytes] for every keyframe interval, read from packets without decoding.
+
+    The summary is small, so it is kept in the shared cache next to the probe data.
+    """
+    key = ffmpeg_cache.file_key(input_path)
+    gops = ffmpeg_cache.get("gops", key)
+    if gops is not None:
+        return gops
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,size,flags", "-of", "csv=p=0", input_path
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    packets = []
+    for line in result.stdout.splitlines():
+        parts = line.split(",")
+        if len(parts) < 3 or parts[0] in ("", "N/A"):
+            continue
+        packets.append((float(parts[0]), int(parts[1]), "K" in parts[2]))
+    packets.sort()
+    gops = []
+    for pts_time, size, key_frame in packets:
+        if key_frame or not gops:
+            gops.append([pts_time, 0])
+        gops[-1][1] += size
+    if gops:
+        ffmpeg_cache.put("gops", key, gops)
+    return gops
+
+def plan_segments(input_path, duration, count):
+    """
+    Split the video at keyframes into about `count` segments.
+
+    Each segment records its source packet bytes so bitrate can follow content complexity.
+    """
+    gops = probe_gops(input_path)
+    keyframes = [start for start, _ in gops]
+    count = max(1, min(count, int(duration // CHUNK_MIN_SECONDS)))
+    bounds = [0.0]
+    for i in range(1, count):
+        if not keyframes:
+            break
+        ideal = duration * i / count
+        nearest = min(keyframes, key=lambda t: abs(t - ideal))
+        if nearest - bounds[-1] >= CHUNK_MIN_SECONDS / 2 and duration - nearest >= CHUNK_MIN_SECONDS / 2:
+            bounds.append(nearest)
+    bounds.append(duration)
+
+    segments = []
+    for start, end in zip(bounds, bounds[1:]):
+        size = sum(b for t, b in gops if start <= t < end)
+        segments.append({"start": start, "end": end, "bytes": size})
+    return segments
+
+def parts_dir(output_path):
+    """Where the segments and journal of a resumable encode of `output_path` live."""
+    return f"{os.path.abspath(output_path)}.parts"
+
+def load_journal(work_dir, input_path):
+    """
+    Read the journal in `work_dir`, or start a fresh one.
+
+    A journal written for another input (or another version of it) is thrown away with its parts.
+    """
+    key = ffmpeg_cache.file_key(input_path)
+    try:
+        with open(os.path.join(work_dir, JOURNAL_NAME)) as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        journal = None
+    if not isinstance(journal, dict) or journal.get("input") != key:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        journal = {"input": key, "segments": None, "done": {}, "passes": []}
+    os.makedirs(work_dir, exist_ok=True)
+    return journal
+
+def save_journal(work_dir, journal):
+    """Write the journal atomically, so a kill mid-write leaves the previous version."""
+    with _lock:
+        path = os.path.join(work_dir, JOURNAL_NAME)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(journal, f)
+        os.replace(temp_path, path)
+
+def is_done(work_dir, journal, name, params):
+    """True if part `name` was finished with the same `params` and is still intact on disk."""
+    entry = journal["done"].get(name)
+    path = os.path.join(work_dir, name)
+    return bool(entry) and entry["params"] == params and os.path.exists(path) and os.path.getsize(path) == entry["size"]
+
+def mark_done(work_dir, journal, name, params):
+    """Record part `name` as finished; `params` must be JSON-plain so it compares equal after a reload."""
+    with _lock:
+        journal["done"][name] = {"params": params, "size": os.path.getsize(os.path.join(work_dir, name))}
+    save_journal(work_dir, journal)
+
+def discard(work_dir):
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+def concat(work_dir, segment_paths, output_path, audio_path=None):
+    """Join video segments losslessly with the concat demuxer, muxing in `audio_path` if given."""
+    list_path = os.path.join(work_dir, "segments.txt")
+    with open(list_path, "w") as f:
+        for path in segment_paths:
+            f.write(f"file '{path}'\n")
+    cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path:
+        cmd.extend(["-i", audio_path, "-map", "0:v", "-map", "1:a"])
+    cmd.extend(["-c", "copy", "-loglevel", "error", output_path])
+    with open("ffmpeg_log.txt", "a") as log:
+        log.write(f"Concat Command: {' '.join(cmd)}\n")
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        print(f"Concat error: {result.stderr.strip()[-500:]}")
+        return False
+    return True
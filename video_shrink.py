@@ -1,13 +1,53 @@
 import os
-import ffmpeg
 import subprocess
 import re
 import math
 import argparse
+import shutil
+import tempfile
+import threading
+import functools
+import json
+import time
+import socket
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
+import ffmpeg_cache
+import ffmpeg_progress
+import video_segments
+import video_inputs
 
 DEFAULT_SIZE_MB = 10.0
-TIMEOUT_SECONDS = 120
+TIMEOUT_SECONDS = 120  # An encode whose progress stalls this long is killed
+AUDIO_KBPS = 128
+CONTAINER_OVERHEAD = 0.01  # Muxing overhead as a fraction of the stream bytes
+SAMPLE_COUNT = 4
+SAMPLE_SECONDS = 5
+CHUNK_WEIGHT_RANGE = (0.5, 2.0)  # Clamp for per-segment bitrate budgets
+BATCH_THREADS_PER_JOB = 4  # x264 gains little beyond a handful of threads
+BATCH_SUFFIX = "_shrunk"
+SCRATCH_SUFFIXES = (".tmp", ".sample", ".bench", ".quality")  # Temp files from a run, before their extension
+VAAPI_DEVICE = "/dev/dri/renderD128"
+VAAPI_UPLOAD = "format=nv12,hwupload=extra_hw_frames=16"
+# Encoder candidates: ffmpeg codec plus the rate-control/speed options that go with it
+ENCODERS = {
+    "h264_vaapi": {"codec": "h264_vaapi", "args": ["-rc_mode", "VBR"], "vaapi": True},
+    "libx264-veryfast": {"codec": "libx264", "args": ["-preset", "veryfast"]},
+    "libx264-superfast": {"codec": "libx264", "args": ["-preset", "superfast"]},
+    "libx264-faster": {"codec": "libx264", "args": ["-preset", "faster"]},
+}
+FALLBACK_ENCODER = "libx264-veryfast"
+BENCH_SECONDS = 4
+QUALITY_SLACK = 0.01  # SSIM an encoder may give up against the best candidate
+SIZE_SLACK = 0.10  # Fraction an encoder may overshoot the requested bitrate
+EARLY_ABORT_MIN_PROGRESS = 0.2  # Fraction of the video encoded before a size projection is trusted
+EARLY_ABORT_MAX_PROGRESS = 0.9  # Past this fraction a pass is left to finish; its real size beats a projection
+EARLY_ABORT_SLACK = 2.0  # Abort band as a multiple of the size tolerance; early projections are noisy
+CRF_RANGE = (16, 40)  # libx264 CRF search range for --quality, best to worst
+QUALITY_METRICS = ("ssim", "psnr")
+# Streams in these codecs can be copied into every container in FORMATS
+PASSTHROUGH_VIDEO_CODECS = {"h264"}
+PASSTHROUGH_AUDIO_CODECS = {"aac"}
 FORMATS = {"MP4": "mp4", "MOV": "mov", "MKV": "mkv"}
 RESOLUTIONS = {"1080p": (1920, 1080), "720p": (1280, 720), "480p": (854, 480)}
 
@@ -19,6 +59,17 @@ def parse_size(size_str):
     value, unit = float(match.group(1)), match.group(2)
     return value if unit == "MB" else value * 1000
 
+def parse_quality(quality_str):
+    """Parse 'ssim:0.97' or 'psnr:40' into (metric, target)."""
+    metric, _, value = quality_str.lower().partition(":")
+    try:
+        target = float(value)
+    except ValueError:
+        target = None
+    if metric not in QUALITY_METRICS or target is None:
+        raise ValueError("Invalid quality: use 'ssim:0.97' or 'psnr:40'")
+    return metric, target
+
 def get_file_size_mb(file_path):
     try:
         return os.path.getsize(file_path) / 1_000_000
@@ -28,7 +79,7 @@ def get_file_size_mb(file_path):
 def probe_video(file_path):
     print(f"Probing: {file_path}")
     try:
-        probe = ffmpeg.probe(file_path)
+        probe = ffmpeg_cache.probe(file_path)
         duration = float(probe['format']['duration'])
         video = next(s for s in probe['streams'] if s['codec_type'] == 'video')
         return duration, int(video['width']), int(video['height'])
@@ -49,225 +100,565 @@ def get_scale_filter(width, height, target_width, target_height, use_vaapi=False
     new_width -= new_width % 2
     new_height -= new_height % 2
     if use_vaapi:
-        return f"scale={new_width}:{new_height},format=nv12,hwupload=extra_hw_frames=16"
+        return f"scale={new_width}:{new_height},{VAAPI_UPLOAD}"
     return f"scale={new_width}:{new_height}"
 
-def check_vaapi_support():
-    """Check if FFmpeg supports h264_vaapi codec."""
+def work_path(input_path, suffix):
+    """A scratch file next to the input, named after its full file name so a.mov and a.mkv never share one."""
+    return os.path.join(os.path.dirname(input_path), os.path.basename(input_path) + suffix)
+
+def sample_offsets(duration, count=SAMPLE_COUNT, length=SAMPLE_SECONDS):
+    """Spread `count` sample start times evenly across the video."""
+    if duration < count * length * 2:
+        return []
+    step = duration / count
+    return [step * i + (step - length) / 2 for i in range(count)]
+
+def available_encoders(cpu_only=False):
+    """Encoder names from ENCODERS that this ffmpeg build and machine can run."""
     try:
-        result = subprocess.run(
-            ["ffmpeg", "-encoders"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        return "h264_vaapi" in result.stdout
+        built_in = set(ffmpeg_cache.encoders())
     except Exception as e:
-        print(f"VAAPI check error: {e}")
+        print(f"Encoder check error: {e}")
+        built_in = set()
+    names = []
+    for name, spec in ENCODERS.items():
+        if spec["codec"] not in built_in:
+            continue
+        if spec.get("vaapi") and (cpu_only or not os.path.exists(VAAPI_DEVICE)):
+            continue
+        names.append(name)
+    return names or [FALLBACK_ENCODER]
+
+def build_encode_cmd(input_path, encoder, bitrate, scale_filter=None, threads=4, audio=True, start=None, length=None,
+                     crf=None):
+    """
+    Build the ffmpeg command up to (not including) output options for one encoder.
+
+    With `crf` the encode is constant-quality (libx264 only) and `bitrate` is ignored.
+    audio is True to encode AAC, "copy" to stream-copy the source audio, or False to drop it.
+    """
+    spec = ENCODERS[encoder]
+    cmd = ["ffmpeg", "-y"]
+    if spec.get("vaapi"):
+        cmd.extend(["-vaapi_device", VAAPI_DEVICE])
+    if start is not None:
+        cmd.extend(["-ss", f"{start:.6f}"])
+    cmd.extend(["-i", input_path])
+    if length is not None:
+        cmd.extend(["-t", f"{length:.6f}"])
+    video_filter = scale_filter
+    if spec.get("vaapi"):
+        # Frames always have to be uploaded to the GPU, scaled or not
+        video_filter = f"{scale_filter},{VAAPI_UPLOAD}" if scale_filter else VAAPI_UPLOAD
+    if video_filter:
+        cmd.extend(["-vf", video_filter])
+    rate = ["-crf", str(crf)] if crf is not None else ["-b:v", f"{int(bitrate)}k"]
+    cmd.extend(["-c:v", spec["codec"]] + rate + spec["args"])
+    if not spec.get("vaapi"):
+        cmd.extend(["-threads", str(threads)])
+    if audio == "copy":
+        cmd.extend(["-c:a", "copy"])
+    elif audio:
+        cmd.extend(["-c:a", "aac", "-b:a", f"{AUDIO_KBPS}k"])
+    else:
+        cmd.append("-an")
+    return cmd
+
+def encode_sample(input_path, output_path, start, length, bitrate, scale_filter=None, encoder=FALLBACK_ENCODER, threads=4):
+    """Encode a short video-only sample to a raw H.264 stream and return its bitrate in kbps."""
+    cmd = build_encode_cmd(input_path, encoder, bitrate, scale_filter, threads, audio=False, start=start, length=length)
+    # Raw elementary stream: no audio and no container, so the size is pure video
+    cmd.extend(["-f", "h264", "-loglevel", "error", output_path])
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        print(f"Sample error: {result.stderr.strip()[-200:]}")
+        return None
+    sample_kbps = os.path.getsize(output_path) * 8 / 1000 / length
+    os.remove(output_path)
+    return sample_kbps
+
+def measure_quality(encoded_path, input_path, start, length, scale_filter=None, metric="ssim"):
+    """Compare an encoded sample against the same source window; returns SSIM (0-1) or PSNR (dB)."""
+    # Pair frames by index: container timebases (e.g. Matroska's 1ms) round timestamps differently
+    reindex = "settb=1/1000,setpts=N"
+    reference = f"[1:v]{reindex},{scale_filter}[ref]" if scale_filter else f"[1:v]{reindex}[ref]"
+    cmd = [
+        "ffmpeg", "-i", encoded_path, "-ss", f"{start:.6f}", "-t", f"{length:.6f}", "-i", input_path,
+        "-lavfi", f"[0:v]{reindex}[enc];{reference};[enc][ref]{metric}", "-f", "null", "-"
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    pattern = r"SSIM .*All:([\d.]+)" if metric == "ssim" else r"PSNR .*average:([\d.]+|inf)"
+    match = re.search(pattern, result.stderr)
+    if not match:
+        return None
+    return float(match.group(1))
+
+def benchmark_encoders(input_path, duration, bitrate, scale_filter=None, threads=4, cpu_only=False):
+    """Encode a few seconds of the real input with each candidate and time it."""
+    start = max(0.0, duration / 2 - BENCH_SECONDS / 2)
+    length = min(BENCH_SECONDS, duration)
+    bench_path = work_path(input_path, ".bench.mkv")
+    results = {}
+    for name in available_encoders(cpu_only):
+        cmd = build_encode_cmd(input_path, name, bitrate, scale_filter, threads, audio=False, start=start, length=length)
+        cmd.extend(["-loglevel", "error", bench_path])
+        started = time.time()
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        elapsed = time.time() - started
+        if result.returncode != 0 or not os.path.exists(bench_path):
+            print(f"Benchmark: {name} failed")
+            continue
+        kbps = os.path.getsize(bench_path) * 8 / 1000 / length
+        ssim = measure_quality(bench_path, input_path, start, length, scale_filter)
+        os.remove(bench_path)
+        if ssim is None:
+            print(f"Benchmark: {name} quality check failed")
+            continue
+        results[name] = {"seconds": round(elapsed, 3), "kbps": round(kbps, 1), "ssim": ssim}
+        print(f"Benchmark: {name} {elapsed:.2f}s, {kbps:.0f} kbps, SSIM {ssim:.4f}")
+    return results
+
+def pick_encoder(results, bitrate):
+    """Fastest encoder that stays near the best SSIM without overshooting the bitrate."""
+    if not results:
+        return FALLBACK_ENCODER
+    best_ssim = max(r["ssim"] for r in results.values())
+    passing = [
+        name for name, r in results.items()
+        if r["ssim"] >= best_ssim - QUALITY_SLACK and r["kbps"] <= bitrate * (1 + SIZE_SLACK)
+    ]
+    if not passing:
+        return FALLBACK_ENCODER
+    return min(passing, key=lambda name: results[name]["seconds"])
+
+_select_lock = threading.Lock()
+
+def select_encoder(input_path, duration, bitrate, scale_filter=None, threads=4, cpu_only=False):
+    """
+    Choose an encoder without prompting, benchmarking once per host and output size.
+
+    The choice is cached with the probe data, keyed by hostname, ffmpeg build and scale.
+    """
+    candidates = available_encoders(cpu_only)
+    if len(candidates) == 1:
+        return candidates[0]
+    key = f"{socket.gethostname()}|{ffmpeg_cache.ffmpeg_key()}|{scale_filter or 'source'}|{'cpu' if cpu_only else 'any'}"
+    # Concurrent batch jobs would otherwise all benchmark at once and skew the timings
+    with _select_lock:
+        cached = ffmpeg_cache.get("encoder_choice", key)
+        if cached and cached["encoder"] in candidates:
+            print(f"Encoder: {cached['encoder']} (cached)")
+            return cached["encoder"]
+        results = benchmark_encoders(input_path, duration, bitrate, scale_filter, threads, cpu_only)
+        choice = pick_encoder(results, bitrate)
+        ffmpeg_cache.put("encoder_choice", key, {"encoder": choice, "results": results})
+    print(f"Encoder: {choice}")
+    return choice
+
+def sample_audio_kbps(input_path, offsets, length=SAMPLE_SECONDS):
+    """Measure the real AAC bitrate over the sample windows (0 when there is no audio)."""
+    output_path = work_path(input_path, ".sample.aac")
+    rates = []
+    for start in offsets:
+        cmd = [
+            "ffmpeg", "-y", "-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", input_path,
+            "-vn", "-c:a", "aac", "-b:a", f"{AUDIO_KBPS}k", "-f", "adts", "-loglevel", "error", output_path
+        ]
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0 or not os.path.exists(output_path):
+            return 0
+        rates.append(os.path.getsize(output_path) * 8 / 1000 / length)
+        os.remove(output_path)
+    return sum(rates) / len(rates)
+
+def predict_bitrate(input_path, size_mb, duration, scale_filter=None, encoder=FALLBACK_ENCODER, threads=4, audio_kbps=None):
+    """
+    Predict the video bitrate that produces a `size_mb` file from a few short samples.
+
+    Each sample is encoded at two bitrates and a linear requested->actual model is fitted.
+    The audio track (measured unless audio_kbps is known) and container overhead are
+    taken out of the size budget first. Returns None when the video is too short to sample or the samples fail.
+    """
+    offsets = sample_offsets(duration)
+    if not offsets:
+        print("Prediction: video too short to sample, using bisection")
+        return None
+
+    if audio_kbps is None:
+        audio_kbps = sample_audio_kbps(input_path, offsets)
+    total_kbps = (size_mb * 8000) / duration / (1 + CONTAINER_OVERHEAD)
+    video_budget = total_kbps - audio_kbps
+    if video_budget < 100:
+        print(f"Prediction: {video_budget:.0f} kbps left for video, using bisection")
+        return None
+
+    sample_path = work_path(input_path, ".sample.h264")
+    points = []
+    for requested in (video_budget, video_budget / 2):
+        rates = []
+        for start in offsets:
+            rate = encode_sample(input_path, sample_path, start, SAMPLE_SECONDS, requested, scale_filter, encoder, threads)
+            if rate is None:
+                return None
+            rates.append(rate)
+        points.append((requested, sum(rates) / len(rates)))
+        print(f"Sampled {requested:.0f} kbps -> {points[-1][1]:.0f} kbps actual")
+
+    (x1, y1), (x2, y2) = points
+    slope = (y1 - y2) / (x1 - x2)
+    if slope <= 0:
+        print("Prediction: samples did not track bitrate, using bisection")
+        return None
+    intercept = y1 - slope * x1
+    bitrate = max(100, (video_budget - intercept) / slope)
+    print(f"Predicted bitrate: {bitrate:.0f} kbps (video budget {video_budget:.0f} kbps + {audio_kbps:.0f} kbps audio)")
+    return bitrate
+
+def run_ffmpeg(cmd, duration, desc="Encoding", on_progress=None):
+    """
+    Run an ffmpeg command with a tqdm bar and stall detection. Returns an FFmpegResult.
+
+    on_progress(event) sees every progress event too and may return False to abort.
+    """
+    with open("ffmpeg_log.txt", "a") as log:
+        log.write(f"Command: {' '.join(cmd)}\n")
+        print(f"Command: {' '.join(cmd)}")
+        progress_bar = tqdm(total=duration, desc=desc, unit="s")
+        show = ffmpeg_progress.tqdm_progress(progress_bar, duration)
+
+        def update(event):
+            show(event)
+            return on_progress(event) if on_progress else None
+
+        try:
+            result = ffmpeg_progress.run_ffmpeg(cmd, update, TIMEOUT_SECONDS, log)
+        finally:
+            progress_bar.close()
+
+        if result.stalled:
+            print(f"FFmpeg stalled for {TIMEOUT_SECONDS}s and was stopped")
+        elif result.returncode != 0 and not result.aborted:
+            print(f"FFmpeg error (code {result.returncode}): {result.stderr[-2000:]}")
+        return result
+
+def sample_quality(input_path, crf, offsets, length, scale_filter=None, encoder=FALLBACK_ENCODER, threads=4, metric="ssim"):
+    """Encode each sample window at `crf`; returns (mean score, mean video kbps) or (None, None)."""
+    sample_path = work_path(input_path, ".quality.mkv")
+    scores, rates = [], []
+    for start in offsets:
+        cmd = build_encode_cmd(input_path, encoder, 0, scale_filter, threads, audio=False, start=start, length=length, crf=crf)
+        cmd.extend(["-loglevel", "error", sample_path])
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0 or not os.path.exists(sample_path):
+            print(f"Sample error: {result.stderr.strip()[-200:]}")
+            return None, None
+        rates.append(os.path.getsize(sample_path) * 8 / 1000 / length)
+        score = measure_quality(sample_path, input_path, start, length, scale_filter, metric)
+        os.remove(sample_path)
+        if score is None:
+            return None, None
+        scores.append(score)
+    return sum(scores) / len(scores), sum(rates) / len(rates)
+
+def find_crf(input_path, duration, metric, target, scale_filter=None, encoder=FALLBACK_ENCODER, threads=4):
+    """
+    Binary-search the highest (smallest file) CRF whose samples still reach `target`.
+
+    Short videos are measured whole instead of sampled.
+    """
+    offsets = sample_offsets(duration)
+    length = SAMPLE_SECONDS
+    if not offsets:
+        offsets, length = [0.0], duration
+    low, high = CRF_RANGE
+    best = None
+    while low <= high:
+        crf = (low + high) // 2
+        score, kbps = sample_quality(input_path, crf, offsets, length, scale_filter, encoder, threads, metric)
+        if score is None:
+            return None
+        print(f"CRF {crf}: {metric.upper()} {score:.4f}, ~{kbps:.0f} kbps")
+        if score >= target:
+            best = crf
+            low = crf + 1
+        else:
+            high = crf - 1
+    if best is None:
+        print(f"{metric.upper()} {target} not reached even at CRF {CRF_RANGE[0]}, using it anyway")
+        best = CRF_RANGE[0]
+    return best
+
+def encode_video(input_path, output_path, bitrate, duration, output_ext, scale_filter=None, threads=4, encoder=None,
+                 audio=True, crf=None, on_progress=None):
+    """
+    Encode with `encoder` (default FALLBACK_ENCODER), falling back to FALLBACK_ENCODER on failure.
+
+    `scale_filter` is a plain CPU filter; GPU upload is added per encoder. Never prompts.
+    An encode aborted by `on_progress` returns False without trying the fallback.
+    """
+    chain = [encoder or FALLBACK_ENCODER]
+    if FALLBACK_ENCODER not in chain:
+        chain.append(FALLBACK_ENCODER)
+
+    for attempt, name in enumerate(chain):
+        target = f"CRF {crf}" if crf is not None else f"{bitrate:.0f} kbps"
+        print(f"Encoding: {input_path} -> {output_path} at {target} with {name}")
+        cmd = build_encode_cmd(input_path, name, bitrate, scale_filter, threads, audio, crf=crf)
+        if on_progress:
+            # Write every packet through so progress reports exact sizes, not buffered 256 KiB steps
+            cmd.extend(["-flush_packets", "1"])
+        cmd.extend(["-loglevel", "info", output_path])
+        try:
+            result = run_ffmpeg(cmd, duration, f"Encoding ({name})", on_progress)
+            if result.aborted:
+                return False
+            if result.returncode == 0:
+                if os.path.exists(output_path):
+                    return True
+                print(f"Error: Output '{output_path}' not created")
+        except Exception as e:
+            print(f"Encode error: {e}")
+            with open("ffmpeg_log.txt", "a") as log:
+                log.write(f"Error: {e}\n")
+        if attempt + 1 < len(chain):
+            print(f"{name} failed, falling back to {chain[attempt + 1]}")
+    return False
+
+def segment_bitrates(segments, bitrate):
+    """Share the total bit budget between segments by source bytes per second."""
+    duration = sum(seg["end"] - seg["start"] for seg in segments)
+    total_bytes = sum(seg["bytes"] for seg in segments)
+    if not total_bytes:
+        return [bitrate] * len(segments)
+    low, high = CHUNK_WEIGHT_RANGE
+    weights = []
+    for seg in segments:
+        density = seg["bytes"] / max(seg["end"] - seg["start"], 0.001)
+        weights.append(min(high, max(low, density * duration / total_bytes)))
+    # Renormalize so the weighted sum still spends exactly bitrate * duration
+    norm = duration / sum(w * (seg["end"] - seg["start"]) for w, seg in zip(weights, segments))
+    return [max(100, bitrate * w * norm) for w in weights]
+
+def encode_segment(input_path, segment_path, segment, bitrate, scale_filter, threads, report, encoder=FALLBACK_ENCODER,
+                   crf=None):
+    """Encode one video-only segment, calling report(seconds) as it advances."""
+    length = segment["end"] - segment["start"]
+    cmd = build_encode_cmd(input_path, encoder, bitrate, scale_filter, threads, audio=False,
+                           start=segment["start"], length=length, crf=crf)
+    cmd.extend(["-map", "0:v:0", "-loglevel", "error", segment_path])
+    done = [0.0]
+
+    def advance(event):
+        if event.out_time is not None and min(event.out_time, length) > done[0]:
+            report(min(event.out_time, length) - done[0])
+            done[0] = min(event.out_time, length)
+
+    result = ffmpeg_progress.run_ffmpeg(cmd, advance, TIMEOUT_SECONDS)
+    report(length - done[0])
+    if result.returncode != 0 or not os.path.exists(segment_path):
+        print(f"Segment error at {segment['start']:.1f}s: {result.stderr[-1000:]}")
         return False
+    return True
 
-def encode_video(input_path, output_path, bitrate, duration, output_ext, scale_filter=None):
-    print(f"Encoding: {input_path} -> {output_path} at {bitrate:.0f} kbps")
-    ffmpeg_path = "ffmpeg"
-    
-    use_vaapi = check_vaapi_support()
-    codec = "h264_vaapi" if use_vaapi else "libx264"
-    
-    if not use_vaapi:
-        print("VAAPI not supported. Continue with CPU-only encoding (libx264)? [y/n]")
-        response = input().strip().lower()
-        if response != 'y':
-            print("Exiting...")
-            exit(1)
-    
-    print(f"Using {'GPU (h264_vaapi)' if use_vaapi else 'CPU (libx264)'} for video encoding. CPU used for audio and filtering.")
-    
-    try:
-        cmd = [ffmpeg_path, "-y"]
-        if use_vaapi:
-            cmd.extend(["-vaapi_device", "/dev/dri/renderD128"])
-        cmd.extend(["-i", input_path])
-        
-        if scale_filter:
-            cmd.extend(["-vf", scale_filter])
-        
-        cmd.extend([
-            "-c:v", codec, "-b:v", f"{int(bitrate)}k",
-            "-c:a", "aac", "-b:a", "128k"
-        ])
-        
-        if use_vaapi:
-            cmd.extend(["-rc_mode", "VBR"])
+def encode_video_chunked(input_path, output_path, bitrate, duration, output_ext, scale_filter=None, segments=None, jobs=None,
+                         encoder=FALLBACK_ENCODER, audio=True, crf=None, resume_dir=None, cpu_budget=None):
+    """
+    Encode keyframe-aligned segments concurrently and concatenate them losslessly.
+
+    Audio is encoded once for the whole file so segment boundaries never cut an AAC frame.
+    With `resume_dir`, finished parts are journaled there and kept, so a rerun after an
+    interruption only encodes what is missing; the caller discards the directory when done.
+    Segment jobs and their threads share `cpu_budget` cores (default: all of them).
+    """
+    cores = cpu_budget or os.cpu_count() or 1
+    jobs = jobs or max(1, cores // 2)
+    work_dir = resume_dir or tempfile.mkdtemp(prefix="chunks_", dir=os.path.dirname(os.path.abspath(output_path)))
+    journal = video_segments.load_journal(work_dir, input_path) if resume_dir else None
+    if journal is not None:
+        # Keep the first plan so the parts on disk still line up after a restart
+        if journal["segments"]:
+            segments = journal["segments"]
         else:
-            cmd.extend(["-preset", "veryfast", "-threads", "4"])
-        
-        cmd.extend(["-progress", "pipe:2", "-loglevel", "info", output_path])
+            journal["segments"] = segments = segments or video_segments.plan_segments(input_path, duration, jobs * 2)
+            video_segments.save_journal(work_dir, journal)
+    if segments is None:
+        segments = video_segments.plan_segments(input_path, duration, jobs * 2)
+    threads = max(1, cores // min(jobs, len(segments)))
+    bitrates = segment_bitrates(segments, bitrate)
+    target = f"CRF {crf}" if crf is not None else f"{bitrate:.0f} kbps"
+    print(f"Chunked encoding: {len(segments)} segments, {jobs} jobs x {threads} threads at {target}")
 
-        with open("ffmpeg_log.txt", "a") as log:
-            log.write(f"Command: {' '.join(cmd)}\n")
-            print(f"Command: {' '.join(cmd)}")
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                env=os.environ
+    try:
+        lock = threading.Lock()
+        progress_bar = tqdm(total=duration, desc="Encoding (chunked)", unit="s")
+
+        def report(seconds):
+            with lock:
+                progress_bar.update(min(seconds, progress_bar.total - progress_bar.n))
+
+        def run(path, seg, rate):
+            name = os.path.basename(path)
+            params = {"start": seg["start"], "end": seg["end"], "bitrate": round(rate, 3), "encoder": encoder,
+                      "scale": scale_filter, "crf": crf}
+            if journal is not None and video_segments.is_done(work_dir, journal, name, params):
+                report(seg["end"] - seg["start"])
+                return True
+            success = encode_segment(input_path, path, seg, rate, scale_filter, threads, report, encoder, crf)
+            if success and journal is not None:
+                video_segments.mark_done(work_dir, journal, name, params)
+            return success
+
+        segment_paths = [os.path.join(work_dir, f"segment_{i:04d}.mp4") for i in range(len(segments))]
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                futures = [
+                    pool.submit(run, path, seg, rate)
+                    for path, seg, rate in zip(segment_paths, segments, bitrates)
+                ]
+                results = [future.result() for future in futures]
+        finally:
+            progress_bar.close()
+        if not all(results):
+            return False
+
+        audio_path = os.path.join(work_dir, "audio.m4a")
+        audio_args = ["-c:a", "copy"] if audio == "copy" else ["-c:a", "aac", "-b:a", f"{AUDIO_KBPS}k"]
+        audio_params = {"audio": audio_args}
+        if audio and not (journal is not None and video_segments.is_done(work_dir, journal, "audio.m4a", audio_params)):
+            subprocess.run(
+                ["ffmpeg", "-y", "-i", input_path, "-map", "0:a:0?", "-vn"] + audio_args + ["-loglevel", "error", audio_path],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE
             )
+            if journal is not None and os.path.exists(audio_path) and os.path.getsize(audio_path) > 0:
+                video_segments.mark_done(work_dir, journal, "audio.m4a", audio_params)
+        has_audio = bool(audio) and os.path.exists(audio_path) and os.path.getsize(audio_path) > 0
+        return video_segments.concat(work_dir, segment_paths, output_path, audio_path if has_audio else None)
+    finally:
+        if not resume_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
 
-            time_regex = re.compile(r"out_time_ms=(\d+)")
-            progress_bar = tqdm(total=duration, desc="Encoding", unit="s")
-            stderr_lines = []
-            try:
-                while True:
-                    line = process.stderr.readline()
-                    if not line and process.poll() is not None:
-                        break
-                    stderr_lines.append(line)
-                    log.write(line)
-                    match = time_regex.search(line)
-                    if match:
-                        current_time = int(match.group(1)) / 1_000_000
-                        progress_bar.n = min(current_time, duration)
-                        progress_bar.refresh()
-            finally:
-                progress_bar.close()
-            
-            stdout, stderr = process.communicate(timeout=TIMEOUT_SECONDS)
-            log.write(f"Stdout: {stdout}\nStderr: {stderr}\n")
-
-            if process.returncode != 0:
-                print(f"FFmpeg error (code {process.returncode}): {''.join(stderr_lines[-10:])}")
-                if use_vaapi:
-                    print("VAAPI encoding failed. Retry with CPU-only encoding (libx264)? [y/n]")
-                    response = input().strip().lower()
-                    if response == 'y':
-                        # Retry with libx264
-                        cmd = [ffmpeg_path, "-y", "-i", input_path]
-                        if scale_filter:
-                            # Use CPU scaling for libx264
-                            cpu_scale_filter = scale_filter.replace(",format=nv12,hwupload=extra_hw_frames=16", "")
-                            cmd.extend(["-vf", cpu_scale_filter])
-                        cmd.extend([
-                            "-c:v", "libx264", "-b:v", f"{int(bitrate)}k",
-                            "-c:a", "aac", "-b:a", "128k",
-                            "-preset", "veryfast", "-threads", "4",
-                            "-progress", "pipe:2", "-loglevel", "info", output_path
-                        ])
-                        log.write(f"Retry Command: {' '.join(cmd)}\n")
-                        print(f"Retry Command: {' '.join(cmd)}")
-                        process = subprocess.Popen(
-                            cmd,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                            text=True,
-                            env=os.environ
-                        )
-                        stderr_lines = []
-                        progress_bar = tqdm(total=duration, desc="Encoding (CPU)", unit="s")
-                        try:
-                            while True:
-                                line = process.stderr.readline()
-                                if not line and process.poll() is not None:
-                                    break
-                                stderr_lines.append(line)
-                                log.write(line)
-                                match = time_regex.search(line)
-                                if match:
-                                    current_time = int(match.group(1)) / 1_000_000
-                                    progress_bar.n = min(current_time, duration)
-                                    progress_bar.refresh()
-                        finally:
-                            progress_bar.close()
-                        
-                        stdout, stderr = process.communicate(timeout=TIMEOUT_SECONDS)
-                        log.write(f"Stdout: {stdout}\nStderr: {stderr}\n")
-
-                        if process.returncode != 0:
-                            print(f"CPU encoding error (code {process.returncode}): {''.join(stderr_lines[-10:])}")
-                            return False
-
-                        if not os.path.exists(output_path):
-                            print(f"Error: Output '{output_path}' not created")
-                            return False
-                        return True
-                    else:
-                        print("Exiting...")
-                        return False
-                return False
+def plan_passthrough(input_path, probe, duration, video_budget, target_width, target_height):
+    """
+    Decide which streams can be stream-copied instead of re-encoded.
+
+    Audio is copied when it is already AAC at or below AUDIO_KBPS. Video is copied when it
+    is H.264, needs no downscale and already fits `video_budget` kbps. Returns a dict with
+    copy_video, copy_audio and audio_kbps, the rate the audio track will take.
+    """
+    video = next((s for s in probe['streams'] if s['codec_type'] == 'video'), {})
+    audios = [s for s in probe['streams'] if s['codec_type'] == 'audio']
+    audio = audios[0] if audios else None
+
+    # Matroska has no per-stream bit_rate: count the video packets, then attribute the rest
+    video_kbps = int(video.get('bit_rate') or 0) / 1000
+    if not video_kbps and video:
+        video_kbps = sum(size for _, size in video_segments.probe_gops(input_path)) * 8 / 1000 / duration
+    audio_kbps = int(audio.get('bit_rate') or 0) / 1000 if audio else 0
+    if audio and not audio_kbps and len(probe['streams']) == 2:
+        audio_kbps = max(0, int(probe['format'].get('bit_rate') or 0) / 1000 - video_kbps)
+
+    plan = {"copy_video": False, "copy_audio": False, "audio_kbps": AUDIO_KBPS if audio else 0}
+    if audio and audio.get('codec_name') in PASSTHROUGH_AUDIO_CODECS and 0 < audio_kbps <= AUDIO_KBPS:
+        plan.update(copy_audio=True, audio_kbps=audio_kbps)
+
+    fits_size = int(video.get('width', 0)) <= target_width and int(video.get('height', 0)) <= target_height
+    if video.get('codec_name') in PASSTHROUGH_VIDEO_CODECS and fits_size and 0 < video_kbps <= video_budget:
+        plan["copy_video"] = True
+    return plan
+
+def complexity_curve(input_path, duration):
+    """
+    Return f(t): the fraction of the source's video bytes that lie before t seconds.
+
+    Output size grows roughly like source size, so this beats assuming a constant rate.
+    Falls back to t / duration when packet sizes are unavailable.
+    """
+    gops = video_segments.probe_gops(input_path)
+    total = sum(size for _, size in gops)
+    if not total:
+        return lambda t: min(t / duration, 1.0)
+    ends = [start for start, _ in gops[1:]] + [duration]
 
-        if not os.path.exists(output_path):
-            print(f"Error: Output '{output_path}' not created")
+    def fraction(t):
+        done = 0
+        for (start, size), end in zip(gops, ends):
+            if t >= end:
+                done += size
+            elif t > start:
+                done += size * (t - start) / (end - start)
+        return min(done / total, 1.0)
+
+    return fraction
+
+def size_projector(output_path, duration, size_mb, band_mb, bias=1.0, curve=None):
+    """
+    Build an on_progress callback that projects the final size from bytes written so far.
+
+    The expected share of bytes at each timestamp comes from `curve` (see complexity_curve).
+
+    It aborts the encode (returns False) once the projection leaves size_mb +/- band_mb, unless
+    the encode is done or past EARLY_ABORT_MAX_PROGRESS, where finishing costs less than a restart.
+    `bias` scales the raw projection, e.g. for the mp4 index written only at the end.
+    The returned state dict records the projection, the first raw projection and how far
+    the encode got.
+    """
+    state = {"aborted": False, "projected_mb": None, "first_raw_mb": None, "fraction": 0.0, "started": time.time()}
+
+    def check(event):
+        if event.out_time is None or event.out_time < duration * EARLY_ABORT_MIN_PROGRESS:
+            return None
+        written = event.total_size if event.total_size else os.path.getsize(output_path) if os.path.exists(output_path) else 0
+        if not written:
+            return None
+        state["fraction"] = min(event.out_time / duration, 1.0)
+        share = curve(event.out_time) if curve else state["fraction"]
+        if share <= 0:
+            return None
+        raw_mb = written / 1_000_000 / share
+        if state["first_raw_mb"] is None:
+            state["first_raw_mb"] = raw_mb
+        state["projected_mb"] = raw_mb * bias
+        if event.done or state["fraction"] >= EARLY_ABORT_MAX_PROGRESS:
+            return None
+        if abs(state["projected_mb"] - size_mb) > band_mb:
+            state["aborted"] = True
             return False
-        return True
-    except Exception as e:
-        print(f"Encode error: {e}")
-        with open("ffmpeg_log.txt", "a") as log:
-            log.write(f"Error: {e}\n")
-        if use_vaapi:
-            print("VAAPI encoding failed. Retry with CPU-only encoding (libx264)? [y/n]")
-            response = input().strip().lower()
-            if response == 'y':
-                # Retry with libx264
-                cmd = [ffmpeg_path, "-y", "-i", input_path]
-                if scale_filter:
-                    cpu_scale_filter = scale_filter.replace(",format=nv12,hwupload=extra_hw_frames=16", "")
-                    cmd.extend(["-vf", cpu_scale_filter])
-                cmd.extend([
-                    "-c:v", "libx264", "-b:v", f"{int(bitrate)}k",
-                    "-c:a", "aac", "-b:a", "128k",
-                    "-preset", "veryfast", "-threads", "4",
-                    "-progress", "pipe:2", "-loglevel", "info", output_path
-                ])
-                log.write(f"Retry Command: {' '.join(cmd)}\n")
-                print(f"Retry Command: {' '.join(cmd)}")
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    env=os.environ
-                )
-                stderr_lines = []
-                progress_bar = tqdm(total=duration, desc="Encoding (CPU)", unit="s")
-                try:
-                    while True:
-                        line = process.stderr.readline()
-                        if not line and process.poll() is not None:
-                            break
-                        stderr_lines.append(line)
-                        log.write(line)
-                        match = time_regex.search(line)
-                        if match:
-                            current_time = int(match.group(1)) / 1_000_000
-                            progress_bar.n = min(current_time, duration)
-                            progress_bar.refresh()
-                finally:
-                    progress_bar.close()
-                
-                stdout, stderr = process.communicate(timeout=TIMEOUT_SECONDS)
-                log.write(f"Stdout: {stdout}\nStderr: {stderr}\n")
-
-                if process.returncode != 0:
-                    print(f"CPU encoding error (code {process.returncode}): {''.join(stderr_lines[-10:])}")
-                    return False
-
-                if not os.path.exists(output_path):
-                    print(f"Error: Output '{output_path}' not created")
-                    return False
-                return True
-            else:
-                print("Exiting...")
-                return False
-        return False
+        return None
+
+    return check, state
+
+def resize_video(input_path, size_mb, resolution=None, bitrate=None, format="mp4", predict=False, chunked=False, jobs=None,
+                 output_path=None, threads=4, encoder="auto", passthrough=True, stats=None, quality=None,
+                 early_abort=True, resume=False, cpu_budget=None):
+    """
+    Shrink a video to about `size_mb` (or to `bitrate` kbps) and return the output path.
 
-def resize_video(input_path, size_mb, resolution=None, bitrate=None, format="mp4"):
+    With `quality`, a (metric, target) pair such as ("ssim", 0.97), the size is ignored: the
+    highest CRF that reaches the target on short samples is found and the file is encoded once.
+    With `early_abort`, a size-search pass whose projected size is clearly off target is
+    stopped part-way and the bitrate re-aimed from the projection.
+    With `resume`, encoding is chunked and journaled next to the output (<output>.parts), so
+    rerunning after an interruption continues from the finished segments and size-search passes.
+    `cpu_budget` is the number of cores this file may use (default: all); chunked segment encodes
+    are split within it, so concurrent batch files don't oversubscribe the machine.
+
+    If a `stats` dict is given it is filled with the encoder used and the number of full passes,
+    plus whether the prediction was used (predicted) and the segment count (segments) when asked for.
+    """
+    stats = {} if stats is None else stats
+    stats["passes"] = 0
     input_path = os.path.abspath(input_path)
     size = get_file_size_mb(input_path)
     print(f"Input size: {size:.2f} MB")
     if size == 0:
         print("Error: Invalid input file")
         return None
-    if size_mb >= size:
+    if size_mb >= size and passthrough and not resolution and not bitrate and not quality:
+        print(f"Already under {size_mb} MB, skipping")
+        stats["encoder"] = "skip"
+        return input_path
+    if size_mb >= size and not quality:
         print(f"Error: Target size ({size_mb} MB) too large")
         return None
 
@@ -276,79 +667,323 @@ def resize_video(input_path, size_mb, resolution=None, bitrate=None, format="mp4
         return None
     print(f"Input: {width}x{height}, {duration:.2f}s")
 
-    probe = ffmpeg.probe(input_path)
+    probe = ffmpeg_cache.probe(input_path)
     fmt = next((f for f in probe['format']['format_name'].split(',') if f == 'mp4'), 'mp4').upper()
     output_ext = FORMATS.get(fmt, format)
 
-    output_dir = os.path.dirname(input_path)
-    output_path = os.path.join(output_dir, f"output_video.{output_ext}")
-    temp_path = os.path.join(output_dir, f"temp_output.{output_ext}")
+    if output_path:
+        base, _ = os.path.splitext(output_path)
+        output_path = f"{base}.{output_ext}"
+        temp_path = f"{base}.tmp.{output_ext}"
+    else:
+        output_dir = os.path.dirname(input_path)
+        output_path = os.path.join(output_dir, f"output_video.{output_ext}")
+        temp_path = os.path.join(output_dir, f"temp_output.{output_ext}")
     print(f"Output extension: {output_ext}")
 
     target_width, target_height = RESOLUTIONS[resolution] if resolution in RESOLUTIONS else (width, height)
     print(f"Resolution: {target_width}x{target_height}")
-    scale_filter = get_scale_filter(width, height, target_width, target_height, check_vaapi_support())
+    scale_filter = get_scale_filter(width, height, target_width, target_height)
+
+    target_bitrate = (size_mb * 8000) / duration
+    audio = True
+    audio_kbps = None
+    if passthrough:
+        video_budget = bitrate or target_bitrate / (1 + CONTAINER_OVERHEAD) - AUDIO_KBPS
+        plan = plan_passthrough(input_path, probe, duration, video_budget, target_width, target_height)
+        if plan["copy_video"] and not quality:
+            print("Passthrough: video already fits the target, copying streams")
+            cmd = ["ffmpeg", "-y", "-i", input_path, "-map", "0:v:0", "-map", "0:a:0?", "-c:v", "copy"]
+            cmd.extend(["-c:a", "copy"] if plan["copy_audio"] else ["-c:a", "aac", "-b:a", f"{AUDIO_KBPS}k"])
+            cmd.extend(["-loglevel", "info", output_path])
+            stats["encoder"] = "copy"
+            if run_ffmpeg(cmd, duration, "Remuxing").returncode != 0:
+                return None
+            print(f"Created: {output_path} (~{get_file_size_mb(output_path):.2f} MB)")
+            return output_path
+        if plan["copy_audio"]:
+            audio = "copy"
+            print(f"Passthrough: copying {plan['audio_kbps']:.0f} kbps AAC audio")
+        audio_kbps = plan["audio_kbps"]
+        # Audio bits saved by copying (or by having no audio) go to the video
+        target_bitrate += AUDIO_KBPS - audio_kbps
+    # Chunked mode runs many encodes at once and CRF is a libx264 option: both need the CPU
+    resume_dir = None
+    if resume:
+        chunked = True
+        resume_dir = video_segments.parts_dir(output_path)
+        print(f"Resumable: journaling segments in {resume_dir}")
+    cpu_only = chunked or bool(quality)
+    if encoder == "auto":
+        encoder = select_encoder(input_path, duration, bitrate or target_bitrate, scale_filter, threads, cpu_only=cpu_only)
+    elif cpu_only and ENCODERS[encoder].get("vaapi"):
+        print(f"{encoder} cannot run chunked or with --quality, using {FALLBACK_ENCODER}")
+        encoder = FALLBACK_ENCODER
+    stats["encoder"] = encoder
+
+    encode = functools.partial(encode_video, threads=threads, encoder=encoder, audio=audio)
+    if chunked:
+        # Plan the keyframe split once; every bitrate iteration reuses it
+        cpu_budget = cpu_budget or os.cpu_count() or 1
+        jobs = min(jobs, cpu_budget) if jobs else max(1, cpu_budget // 2)
+        segments = video_segments.plan_segments(input_path, duration, jobs * 2)
+        stats["segments"] = len(segments)
+        encode = functools.partial(encode_video_chunked, segments=segments, jobs=jobs,
+                                   encoder=encoder, audio=audio, resume_dir=resume_dir, cpu_budget=cpu_budget)
+
+    if quality:
+        metric, target = quality
+        crf = find_crf(input_path, duration, metric, target, scale_filter, encoder, threads)
+        if crf is None:
+            return None
+        stats["crf"] = crf
+        success = encode(input_path, output_path, 0, duration, output_ext, scale_filter, crf=crf)
+        stats["passes"] = 1
+        if not success:
+            return None
+        if resume_dir:
+            video_segments.discard(resume_dir)
+        print(f"Created: {output_path} (~{get_file_size_mb(output_path):.2f} MB at CRF {crf})")
+        return output_path
 
     if bitrate:
-        success = encode_video(input_path, output_path, bitrate, duration, output_ext, scale_filter)
+        success = encode(input_path, output_path, bitrate, duration, output_ext, scale_filter)
+        stats["passes"] = 1
         if not success:
             return None
+        if resume_dir:
+            video_segments.discard(resume_dir)
         final_size = get_file_size_mb(output_path)
         print(f"Created: {output_path} (~{final_size:.2f} MB)")
         return output_path
 
-    target_bitrate = (size_mb * 8000) / duration
     min_bitrate, max_bitrate = 100, target_bitrate * 2
     tolerance, max_iter = 0.05, 5
-    first_iter = True
+    under = over = None  # Closest (bitrate, MB) passes below and above the target
 
+    bitrate = (min_bitrate + max_bitrate) / 2
+    if predict:
+        # The first full pass uses the prediction; misses are corrected as usual
+        predicted = predict_bitrate(input_path, size_mb, duration, scale_filter, encoder, threads, audio_kbps)
+        stats["predicted"] = predicted is not None
+        bitrate = predicted or bitrate
+
+    passes = 0
+    aborts, abort_saved = 0, 0.0
+    aborted = False
+    bias = 1.0
+    curve = complexity_curve(input_path, duration) if early_abort and not chunked else None
+    # Size-search passes finished before an interruption are replayed from the journal
+    history = []
+    if resume_dir:
+        journal = video_segments.load_journal(resume_dir, input_path)
+        search = {"size_mb": size_mb, "scale": scale_filter, "encoder": encoder, "audio": audio, "predict": predict}
+        if journal.get("search") == search:
+            history = list(journal["passes"])
+        else:
+            journal.update(search=search, passes=[])
+            video_segments.save_journal(resume_dir, journal)
     for i in range(max_iter):
-        bitrate = (min_bitrate + max_bitrate) / 2 if first_iter else bitrate
         if bitrate < 100:
             min_bitrate = bitrate
             continue
-        print(f"Bitrate: {bitrate:.0f} kbps (iter {i+1}/{max_iter})")
-        success = encode_video(input_path, temp_path, bitrate, duration, output_ext, scale_filter)
-        if not success:
+        # A pass that hit the target is encoded again (from its journaled segments) to get the file
+        if history and abs(history[0][1] - size_mb) >= tolerance * size_mb:
+            bitrate, current_size = history.pop(0)
+            print(f"Bitrate: {bitrate:.0f} kbps (iter {i+1}/{max_iter}): {current_size:.2f} MB from journal")
+        else:
+            history = []
+            print(f"Bitrate: {bitrate:.0f} kbps (iter {i+1}/{max_iter})")
+            # Chunked segments are written to separate files, so only whole-file passes are projected
+            monitor = {}
+            if early_abort and not chunked:
+                projector, projection = size_projector(temp_path, duration, size_mb, tolerance * EARLY_ABORT_SLACK * size_mb,
+                                                       bias, curve)
+                monitor = {"on_progress": projector}
+            success = encode(input_path, temp_path, bitrate, duration, output_ext, scale_filter, **monitor)
+            aborted = bool(monitor) and projection["aborted"]
+            if aborted:
+                elapsed = time.time() - projection["started"]
+                abort_saved += elapsed * (1 / projection["fraction"] - 1)
+                aborts += 1
+                current_size = projection["projected_mb"]
+                print(f"Early abort at {projection['fraction']:.0%}: projected {current_size:.2f} MB")
+            elif not success:
+                return None
+            else:
+                passes += 1
+                stats["passes"] = passes
+                current_size = get_file_size_mb(temp_path)
+                print(f"Size: {current_size:.2f} MB")
+                if resume_dir:
+                    journal = video_segments.load_journal(resume_dir, input_path)
+                    journal["passes"].append([bitrate, current_size])
+                    video_segments.save_journal(resume_dir, journal)
+                if abs(current_size - size_mb) < tolerance * size_mb:
+                    break
+                if monitor and projection["first_raw_mb"]:
+                    # Calibrate later projections against how this finished pass actually ended up
+                    bias = current_size / projection["first_raw_mb"]
+        # Search only between measured passes: a window guessed around the first pass can miss
+        # the target when that pass was far off. Until passes have landed on both sides of the
+        # target, re-aim in proportion to the last size; then interpolate between the closest pair.
+        if current_size > size_mb:
+            over = (bitrate, current_size)
+        else:
+            under = (bitrate, current_size)
+        if over and under:
+            bitrate = under[0] + (size_mb - under[1]) * (over[0] - under[0]) / (over[1] - under[1])
+        elif current_size > 0:
+            bitrate *= size_mb / current_size
+            print(f"New bitrate: {bitrate:.0f} kbps")
+        else:
+            bitrate *= 2
+
+    if aborted:
+        # The last pass never finished; encode once more at the re-aimed bitrate
+        print(f"Bitrate: {bitrate:.0f} kbps (final)")
+        if not encode(input_path, temp_path, bitrate, duration, output_ext, scale_filter):
             return None
+        passes += 1
+        stats["passes"] = passes
         current_size = get_file_size_mb(temp_path)
         print(f"Size: {current_size:.2f} MB")
-        if abs(current_size - size_mb) < tolerance * size_mb:
-            break
-        if first_iter:
-            first_iter = False
-            if current_size > 0:
-                bitrate *= size_mb / current_size
-                min_bitrate = max(100, bitrate * 0.8)
-                max_bitrate = bitrate * 1.2
-                print(f"New bitrate: {bitrate:.0f} kbps")
-            else:
-                max_bitrate = bitrate
-        else:
-            if current_size > size_mb:
-                max_bitrate = bitrate
-            else:
-                min_bitrate = bitrate
+
+    if aborts:
+        stats["early_aborts"] = aborts
+        stats["abort_saved_seconds"] = round(abort_saved, 1)
+        print(f"Early aborts: {aborts}, saved ~{abort_saved:.0f}s of encoding")
+        with open("ffmpeg_log.txt", "a") as log:
+            log.write(f"Early aborts: {aborts}, saved ~{abort_saved:.0f}s of encoding\n")
+    if predict:
+        print(f"Full encodes: {passes}/{max_iter} (saved {max_iter - passes} full passes)")
 
     try:
         os.rename(temp_path, output_path)
+        if resume_dir:
+            video_segments.discard(resume_dir)
         print(f"Created: {output_path} (~{current_size:.2f} MB)")
         return output_path
     except OSError as e:
         print(f"Rename error: {e}")
         return None
 
+def plan_batch(paths, parallel=None):
+    """Order jobs longest-first and split the cores between concurrent encodes."""
+    durations = {}
+    for path in paths:
+        try:
+            durations[path] = float(ffmpeg_cache.probe(path)['format']['duration'])
+        except Exception:
+            durations[path] = 0.0
+    ordered = sorted(paths, key=lambda p: durations[p], reverse=True)
+    cores = os.cpu_count() or 1
+    parallel = parallel or max(1, cores // BATCH_THREADS_PER_JOB)
+    parallel = max(1, min(parallel, len(ordered)))
+    threads = max(1, cores // parallel)
+    return ordered, durations, parallel, threads
+
+def shrink_batch(patterns, size_mb, resolution=None, bitrate=None, format="mp4", predict=False, chunked=False,
+                 jobs=None, parallel=None, output_dir=None, report_path=None, encoder="auto", passthrough=True,
+                 quality=None, early_abort=True, resume=False):
+    """Shrink every matching video with several encodes running at once and report per file."""
+    paths = video_inputs.collect_inputs(patterns, [f".{ext}" for ext in FORMATS.values()],
+                                        (BATCH_SUFFIX,) + SCRATCH_SUFFIXES)
+    if not paths:
+        print("Error: No input videos found")
+        return []
+    outputs = video_inputs.batch_outputs(paths, output_dir, BATCH_SUFFIX)
+    ordered, durations, parallel, threads = plan_batch(paths, parallel)
+    print(f"Batch: {len(ordered)} files, {parallel} concurrent jobs x {threads} threads")
+
+    def run(path):
+        output_path = f"{outputs[path]}.{format}"
+        started = time.time()
+        entry = {"input": path, "duration": durations[path], "input_mb": get_file_size_mb(path)}
+        stats = {}
+        entry["stats"] = stats
+        try:
+            output = resize_video(path, size_mb, resolution, bitrate, format, predict, chunked, jobs,
+                                  output_path=output_path, threads=threads, encoder=encoder, passthrough=passthrough,
+                                  stats=stats, quality=quality, early_abort=early_abort,
+                                  resume=resume, cpu_budget=threads)
+            entry["status"] = "skipped" if output == path else "ok" if output else "failed"
+            entry["output"] = output
+            entry["output_mb"] = get_file_size_mb(output) if output else 0
+        except Exception as e:
+            entry.update(status="failed", output=None, output_mb=0, error=str(e))
+        entry["seconds"] = round(time.time() - started, 2)
+        return entry
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    started = time.time()
+    results = {}
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        futures = {pool.submit(run, path): path for path in ordered}
+        for future in as_completed(futures):
+            entry = future.result()
+            results[entry["input"]] = entry
+            print(f"[{len(results)}/{len(ordered)}] {entry['status']}: {entry['input']}")
+    elapsed = time.time() - started
+
+    entries = [results[path] for path in paths]
+    print("\nBatch summary:")
+    for entry in entries:
+        print(f"  {entry['status']:7} {entry['input_mb']:9.2f} MB -> {entry['output_mb']:9.2f} MB "
+              f"{entry['seconds']:8.1f}s  {os.path.basename(entry['input'])}")
+    succeeded = sum(1 for entry in entries if entry["status"] != "failed")
+    print(f"{succeeded}/{len(entries)} succeeded in {elapsed:.1f}s")
+
+    if report_path:
+        report = {
+            "size_mb": size_mb,
+            "parallel": parallel,
+            "threads_per_job": threads,
+            "elapsed_seconds": round(elapsed, 2),
+            "succeeded": succeeded,
+            "failed": len(entries) - succeeded,
+            "files": entries,
+        }
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {report_path}")
+    return entries
+
 def main():
     try:
         print("Starting script...")
         parser = argparse.ArgumentParser()
+        parser.add_argument("inputs", nargs="*", help="Videos, directories or globs to shrink as a batch")
         parser.add_argument("--downscale", choices=RESOLUTIONS.keys())
         parser.add_argument("--bitrate", type=float)
         parser.add_argument("--size", default=f"{DEFAULT_SIZE_MB}MB")
         parser.add_argument("--format", default="mp4", choices=FORMATS.values())
+        parser.add_argument("--quality", type=parse_quality,
+                            help="Encode to a quality target instead of a size, e.g. ssim:0.97 or psnr:40")
+        parser.add_argument("--predict", action="store_true", help="Predict the bitrate from short samples before the full encode")
+        parser.add_argument("--chunked", action="store_true", help="Encode keyframe-aligned segments in parallel (libx264)")
+        parser.add_argument("--jobs", type=int, help="Concurrent segment encodes for --chunked (default: cores / 2)")
+        parser.add_argument("--encoder", default="auto", choices=["auto"] + list(ENCODERS),
+                            help="Video encoder (default: benchmark once per host and pick the fastest)")
+        parser.add_argument("--resume", action="store_true",
+                            help="Journal segments next to the output so an interrupted run continues where it stopped")
+        parser.add_argument("--no-early-abort", dest="early_abort", action="store_false",
+                            help="Always finish each size-search pass instead of stopping off-target ones early")
+        parser.add_argument("--no-passthrough", dest="passthrough", action="store_false",
+                            help="Always re-encode, even streams that already fit the target")
+        parser.add_argument("--parallel", type=int, help="Concurrent files in batch mode (default: cores / 4)")
+        parser.add_argument("--output-dir", help="Where batch outputs go (default: next to each input)")
+        parser.add_argument("--report", help="Write a JSON report of the batch to this path")
         args = parser.parse_args()
 
         size_mb = parse_size(args.size)
+        if args.inputs:
+            shrink_batch(args.inputs, size_mb, args.downscale, args.bitrate, args.format, args.predict, args.chunked,
+                         args.jobs, args.parallel, args.output_dir, args.report, args.encoder,
+                         args.passthrough, args.quality, args.early_abort, args.resume)
+            return
+
         input_path = None
         for ext in FORMATS.values():
             path = os.path.abspath(f"input_video.{ext}")
@@ -362,7 +997,10 @@ def main():
                 log.write("Error: No input_video found\n")
             return
 
-        output = resize_video(input_path, size_mb, args.downscale, args.bitrate, args.format)
+        output = resize_video(input_path, size_mb, args.downscale, args.bitrate, args.format, args.predict, args.chunked, args.jobs,
+                              encoder=args.encoder, passthrough=args.passthrough,
+                              quality=args.quality, early_abort=args.early_abort,
+                              resume=args.resume)
         print("Conversion " + ("complete: " + output if output else "failed"))
     except Exception as e:
         print(f"Main error: {e}")